@@ -16,9 +16,20 @@ if config.config_file_name is not None:
 
 # add your model's MetaData object here
 # for 'autogenerate' support
-from app import database
+from app import database, models  # noqa: F401, models register their tables in metadata
+from app.core.config import settings
 target_metadata = database.Base.metadata
 
+# Migrate the database, that application is configured with
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """Skip FTS5 tables of search index, that are created by raw DDL, see app/models/search.py"""
+    if type_ == "table":
+        return not name.startswith(("posts_fts", "comments_fts"))
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -42,6 +53,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_name=include_name,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -64,7 +76,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
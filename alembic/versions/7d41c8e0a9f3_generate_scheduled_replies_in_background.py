@@ -0,0 +1,35 @@
+"""Generate scheduled replies in background
+
+Revision ID: 7d41c8e0a9f3
+Revises: 3c9e1f7a2b6d
+Create Date: 2026-10-17 15:10:27.604512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d41c8e0a9f3'
+down_revision: Union[str, None] = '3c9e1f7a2b6d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite can't alter columns in place, so table is recreated by batch operation
+    with op.batch_alter_table('scheduled_replies') as batch_op:
+        batch_op.add_column(sa.Column('comment_id', sa.Integer(), nullable=True))
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=True)
+        batch_op.create_foreign_key('fk_scheduled_replies_comment_id_comments', 'comments', ['comment_id'], ['id'])
+
+
+def downgrade() -> None:
+    # Replies, that are not generated yet, can't be kept without content
+    op.execute("DELETE FROM scheduled_replies WHERE content IS NULL")
+    with op.batch_alter_table('scheduled_replies') as batch_op:
+        batch_op.drop_constraint('fk_scheduled_replies_comment_id_comments', type_='foreignkey')
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('comment_id')
@@ -0,0 +1,81 @@
+"""Create base tables
+
+Revision ID: 9a4f2c7e1b30
+Revises: def0350f4a0f
+Create Date: 2026-10-18 14:05:41.723915
+
+Revisions up to def0350f4a0f were autogenerated against empty metadata, while tables were created by the app on
+startup, so they don't create users, user_profiles, posts, comments and blocked_comments. This revision creates them
+as they were at def0350f4a0f, unless they exist, so empty database stamped with def0350f4a0f upgrades to head, and
+database created by the app is left as is.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f2c7e1b30'
+down_revision: Union[str, None] = 'def0350f4a0f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing_tables:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('auto_respond_to_comments', sa.Boolean(), nullable=True),
+        sa.Column('auto_respond_time', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+        op.create_index('ix_users_id', 'users', ['id'], unique=False)
+        op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    if 'user_profiles' not in existing_tables:
+        op.create_table('user_profiles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('bio', sa.String(), nullable=True),
+        sa.Column('profile_picture', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_user_profiles_id', 'user_profiles', ['id'], unique=False)
+    if 'posts' not in existing_tables:
+        op.create_table('posts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_posts_id', 'posts', ['id'], unique=False)
+        op.create_index('ix_posts_title', 'posts', ['title'], unique=False)
+    for table_name in ('comments', 'blocked_comments'):
+        if table_name not in existing_tables:
+            op.create_table(table_name,
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('content', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('owner_id', sa.Integer(), nullable=True),
+            sa.Column('post_id', sa.Integer(), nullable=True),
+            *([sa.Column('blocking_reasoning', sa.Text(), nullable=True)] if table_name == 'blocked_comments' else []),
+            sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ),
+            sa.PrimaryKeyConstraint('id')
+            )
+            op.create_index(f'ix_{table_name}_id', table_name, ['id'], unique=False)
+
+
+def downgrade() -> None:
+    # Tables may have been created by the app rather than by this revision, so they are kept
+    pass
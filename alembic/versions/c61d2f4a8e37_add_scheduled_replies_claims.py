@@ -0,0 +1,31 @@
+"""Add scheduled replies claims
+
+Revision ID: c61d2f4a8e37
+Revises: e3a7b9d15f08
+Create Date: 2026-10-18 10:12:37.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61d2f4a8e37'
+down_revision: Union[str, None] = 'e3a7b9d15f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('scheduled_replies', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+    op.add_column('scheduled_replies', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('scheduled_replies', sa.Column('failed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('scheduled_replies') as batch_op:
+        batch_op.drop_column('failed_at')
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('claimed_at')
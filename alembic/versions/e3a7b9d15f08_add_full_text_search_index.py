@@ -0,0 +1,55 @@
+"""Add full-text search index
+
+Revision ID: e3a7b9d15f08
+Revises: b58f0e6d4c21
+Create Date: 2026-10-17 17:41:06.285137
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7b9d15f08'
+down_revision: Union[str, None] = 'b58f0e6d4c21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # External content FTS5 tables, reading text from posts and comments, kept in sync by triggers
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts "
+               "USING fts5(title, content, content='posts', content_rowid='id', tokenize='porter unicode61')")
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts "
+               "USING fts5(content, content='comments', content_rowid='id', tokenize='porter unicode61')")
+
+    op.execute("CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+               "INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+               "INSERT INTO posts_fts(posts_fts, rowid, title, content) "
+               "VALUES ('delete', old.id, old.title, old.content); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content ON posts BEGIN "
+               "INSERT INTO posts_fts(posts_fts, rowid, title, content) "
+               "VALUES ('delete', old.id, old.title, old.content); "
+               "INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END")
+
+    op.execute("CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN "
+               "INSERT INTO comments_fts(rowid, content) VALUES (new.id, new.content); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN "
+               "INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.id, old.content); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF content ON comments BEGIN "
+               "INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+               "INSERT INTO comments_fts(rowid, content) VALUES (new.id, new.content); END")
+
+    # Index existing posts and comments
+    op.execute("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+    op.execute("INSERT INTO comments_fts(comments_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    for trigger in ("posts_fts_insert", "posts_fts_delete", "posts_fts_update",
+                    "comments_fts_insert", "comments_fts_delete", "comments_fts_update"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS posts_fts")
+    op.execute("DROP TABLE IF EXISTS comments_fts")
@@ -0,0 +1,28 @@
+"""
+Rebuild comment_daily_stats rollup from comments and blocked_comments tables.
+
+Rollup is maintained by the application on every comment creation and deletion, so this is only needed after
+importing comments bypassing the API, or to repair the rollup.
+
+Usage:
+    python -m app.cli.backfill_comment_daily_stats
+"""
+import argparse
+import time
+
+from ..database import engine
+from ..services.comment_daily_stats import rebuild_comment_daily_stats
+
+
+def main() -> None:
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        rows_amount = rebuild_comment_daily_stats(connection)
+
+    print(f"Rebuilt comment_daily_stats: {rows_amount} rows in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
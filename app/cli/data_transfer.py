@@ -0,0 +1,276 @@
+"""
+Export tables to JSONL files and import them back, bypassing the API.
+
+Every table is written to its own TABLE.jsonl file in given directory, one row per line, ordered by id. Rows are
+streamed in chunks both ways and each imported chunk is committed in its own transaction, so memory usage doesn't
+depend on the table size. Tables are processed in order of their foreign keys: users, user_profiles, posts,
+blocked_comments, comments. Blocked comments are imported before comments with their exported ids, so comments,
+flagged on import, get new ids after them.
+
+On import comments are moderated the same way as ones created through the API: flagged comments go to
+blocked_comments table. Posts are imported without moderation, so import only posts from trusted sources. Moderation calls of the whole import are sent one after another on one pooled HTTP client,
+and rate limited calls are retried with backoff. Use --skip-moderation for data, that was already moderated, e.g.
+exported from this app. Comments daily rollup is rebuilt after comments are imported.
+
+Interrupted import can be resumed with --skip-existing. Comments, that are already in comments table or were moved
+to blocked_comments by interrupted import, are skipped without moderating them again.
+
+Usage:
+    python -m app.cli.data_transfer export --dir dump
+    python -m app.cli.data_transfer import --dir dump --skip-moderation
+    python -m app.cli.data_transfer import --dir dump --tables comments --chunk-size 5000 --skip-existing
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+from datetime import date, datetime
+from typing import Iterator, TextIO
+
+import httpx
+from sqlalchemy import Connection, Date, DateTime, Engine, Table, insert, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..core.http_client import create_http_client
+from ..database import engine
+from ..models import User, UserProfile, Post, Comment, BlockedComment
+from ..services.comment_daily_stats import rebuild_comment_daily_stats
+from ..services.llm_moderation import moderation_service
+
+# Blocked comments go before comments, so comments, moved to blocked_comments on import, don't take their ids
+TABLES: dict[str, Table] = {model.__tablename__: model.__table__
+                            for model in (User, UserProfile, Post, BlockedComment, Comment)}
+
+# Attempts of moderation call, failed with rate limit or server error, and delay before the first retry in seconds.
+# Delay is doubled after every attempt, unless API asks for specific delay with Retry-After header
+MODERATION_ATTEMPTS = 6
+MODERATION_RETRY_DELAY = 1.0
+# Rows, looked up in database with one statement on resumed import
+LOOKUP_BATCH_SIZE = 500
+
+
+def _to_json(value):
+    """Serialize column values, that JSON doesn't support"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _parse_row(table: Table, row: dict) -> dict:
+    """Convert JSON values of row back to column types"""
+    for column in table.columns:
+        value = row.get(column.name)
+        if isinstance(value, str) and isinstance(column.type, DateTime):
+            row[column.name] = datetime.fromisoformat(value)
+        elif isinstance(value, str) and isinstance(column.type, Date):
+            row[column.name] = date.fromisoformat(value)
+    return row
+
+
+def _read_chunks(file: TextIO, chunk_size: int) -> Iterator[list[dict]]:
+    """Read JSONL file lazily, chunk by chunk"""
+    chunk = []
+    for line in file:
+        if line.strip():
+            chunk.append(json.loads(line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_table(sync_engine: Engine, table: Table, file: TextIO, chunk_size: int) -> int:
+    """
+    Write all rows of table to file as JSON lines
+    :param sync_engine: Engine of database to export from
+    :param table: Table to export
+    :param file: Text file to write to
+    :param chunk_size: Amount of rows fetched from database at once
+    :return: Amount of exported rows
+    """
+    rows_amount = 0
+    with sync_engine.connect() as connection:
+        result = connection.execution_options(yield_per=chunk_size).execute(select(table).order_by(table.c.id))
+        for partition in result.mappings().partitions():
+            file.writelines(json.dumps(dict(row), default=_to_json) + "\n" for row in partition)
+            rows_amount += len(partition)
+    return rows_amount
+
+
+class _Moderator:
+    """
+    Moderator of imported comments. All chunks of import are moderated on one event loop with one pooled HTTP client,
+    so connections are reused and calls are sent one after another
+    """
+
+    def __init__(self):
+        self._runner = asyncio.Runner()
+        self._http_client: httpx.AsyncClient | None = None
+
+    def __enter__(self) -> "_Moderator":
+        self._runner.__enter__()
+        self._http_client = self._runner.run(self._create_http_client())
+        moderation_service.http_client = self._http_client
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        moderation_service.http_client = None
+        try:
+            self._runner.run(self._http_client.aclose())
+        finally:
+            self._runner.__exit__(*exc_info)
+
+    @staticmethod
+    async def _create_http_client() -> httpx.AsyncClient:
+        return create_http_client()
+
+    @staticmethod
+    async def _moderate_contents(contents: list[str]) -> list[dict]:
+        """Moderate contents, retrying calls failed with rate limit or server error"""
+        for attempt in range(MODERATION_ATTEMPTS):
+            try:
+                return await moderation_service.moderate_contents(contents)
+            except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code
+                if (status_code != 429 and status_code < 500) or attempt == MODERATION_ATTEMPTS - 1:
+                    raise
+                delay = MODERATION_RETRY_DELAY * 2 ** attempt
+                try:
+                    delay = max(delay, float(e.response.headers.get("retry-after", 0)))
+                except ValueError:
+                    pass
+                print(f"Moderation API answered {status_code}, retrying in {delay:.1f}s")
+                # Verdicts of already moderated contents are cached, so retry sends the rest only
+                await asyncio.sleep(delay)
+
+    def moderate(self, rows: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        Split comments into accepted and blocked ones by moderation
+        :return: Tuple of accepted comments and blocked comments with blocking reasoning
+        """
+        results = self._runner.run(self._moderate_contents([row["content"] for row in rows]))
+
+        accepted, blocked = [], []
+        for row, moderation_result in zip(rows, results):
+            if moderation_result.get("flagged"):
+                categories = moderation_result.get("categories") or {}
+                blocked.append({**row, "blocking_reasoning": ' '.join(
+                    [reason for reason in categories.keys() if categories.get(reason)])})
+            else:
+                accepted.append(row)
+        return accepted, blocked
+
+
+def _skip_imported_comments(connection: Connection, rows: list[dict]) -> list[dict]:
+    """
+    Drop comments, imported before interrupted import, i.e. ones with existing ids and ones moved to blocked_comments.
+    Blocked comments get new ids, so they are matched by author, post, time and content
+    """
+    comment_ids, blocked_keys = set(), set()
+    blocked = BlockedComment.__table__
+    for start in range(0, len(rows), LOOKUP_BATCH_SIZE):
+        batch = rows[start:start + LOOKUP_BATCH_SIZE]
+        comment_ids.update(connection.scalars(select(Comment.__table__.c.id)
+                                              .filter(Comment.__table__.c.id.in_([row["id"] for row in batch]))))
+        keys = [(row["owner_id"], row["post_id"], row["created_at"], row["content"]) for row in batch]
+        blocked_columns = (blocked.c.owner_id, blocked.c.post_id, blocked.c.created_at, blocked.c.content)
+        blocked_keys.update(tuple(key) for key in connection.execute(select(*blocked_columns)
+                                                                     .filter(tuple_(*blocked_columns).in_(keys))))
+    return [row for row in rows
+            if row["id"] not in comment_ids
+            and (row["owner_id"], row["post_id"], row["created_at"], row["content"]) not in blocked_keys]
+
+
+def import_table(sync_engine: Engine, table: Table, file: TextIO, chunk_size: int,
+                 moderate: bool = False, skip_existing: bool = False) -> int:
+    """
+    Insert rows from JSON lines file into table, committing each chunk in its own transaction
+    :param sync_engine: Engine of database to import to
+    :param table: Table to import
+    :param file: Text file to read from
+    :param chunk_size: Amount of rows inserted in one transaction
+    :param moderate: Moderate comments, moving flagged ones to blocked_comments. Only applies to comments table
+    :param skip_existing: Skip rows with ids, that already exist, instead of failing. Allows resuming import.
+    Comments, moved to blocked_comments by interrupted import, are skipped too
+    :return: Amount of read rows, including skipped ones and comments moved to blocked_comments
+    """
+    def insert_statement(target: Table):
+        return sqlite_insert(target).on_conflict_do_nothing() if skip_existing else insert(target)
+
+    is_comments = table is Comment.__table__
+    rows_amount = 0
+    with _Moderator() if moderate and is_comments else contextlib.nullcontext() as moderator:
+        for chunk in _read_chunks(file, chunk_size):
+            rows = [_parse_row(table, row) for row in chunk]
+            if skip_existing and is_comments:
+                with sync_engine.connect() as connection:
+                    rows = _skip_imported_comments(connection, rows)
+
+            blocked = []
+            if moderator is not None and rows:
+                rows, blocked = moderator.moderate(rows)
+
+            with sync_engine.begin() as connection:
+                if rows:
+                    connection.execute(insert_statement(table), rows)
+                if blocked:
+                    # Ids of blocked comments are assigned by blocked_comments table
+                    connection.execute(insert(BlockedComment.__table__),
+                                       [{key: value for key, value in row.items() if key != "id"} for row in blocked])
+            rows_amount += len(chunk)
+    return rows_amount
+
+
+def _report(title: str, rows_amount: int, seconds: float) -> None:
+    """Print amount of processed rows and throughput"""
+    print(f"{title}: {rows_amount} rows in {seconds:.2f}s ({rows_amount / seconds if seconds else 0:.0f} rows/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("--dir", required=True, help="Directory with TABLE.jsonl files")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES),
+                        help="Tables to process, all by default")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="Rows read from database or inserted in one transaction at once")
+    parser.add_argument("--skip-moderation", action="store_true",
+                        help="Import comments without moderation. Posts are never moderated on import")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Skip rows with already existing ids instead of failing")
+    args = parser.parse_args()
+
+    # Keep foreign keys order regardless of order of arguments
+    table_names = [table_name for table_name in TABLES if table_name in args.tables]
+    os.makedirs(args.dir, exist_ok=True)
+
+    started = time.perf_counter()
+    total = 0
+    for table_name in table_names:
+        path = os.path.join(args.dir, f"{table_name}.jsonl")
+        table_started = time.perf_counter()
+        if args.action == "export":
+            with open(path, "w", encoding="utf-8") as file:
+                rows_amount = export_table(engine, TABLES[table_name], file, args.chunk_size)
+        else:
+            if not os.path.exists(path):
+                print(f"Skipped {table_name}: {path} doesn't exist")
+                continue
+            with open(path, encoding="utf-8") as file:
+                rows_amount = import_table(engine, TABLES[table_name], file, args.chunk_size,
+                                           moderate=not args.skip_moderation, skip_existing=args.skip_existing)
+        _report(f"{args.action.capitalize()}ed {table_name}", rows_amount, time.perf_counter() - table_started)
+        total += rows_amount
+
+    if args.action == "import" and {"comments", "blocked_comments"} & set(table_names):
+        with engine.begin() as connection:
+            rebuild_comment_daily_stats(connection)
+
+    _report("Total", total, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
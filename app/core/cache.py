@@ -0,0 +1,180 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """
+    In-process cache with bounded size, per-entry time to live and least recently used eviction.
+
+    Keeps hit, miss and eviction counters for metrics. Not thread-safe, meant to be used from the event loop.
+    """
+
+    def __init__(self, max_size: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        """
+        :param max_size: Maximum amount of entries. Least recently used entry is evicted, when it is exceeded
+        :param ttl: Time to live of entry, in seconds
+        :param timer: Clock function, returning seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._timer = timer
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get value by key, if it is present and not expired
+        :param key: Cache key
+        :param default: Value to return on miss
+        :return: Cached value or default
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._timer():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Put value to cache, evicting least recently used entries if cache is full"""
+        self._entries[key] = (self._timer() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Remove entry by key, if present"""
+        self._entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Remove all entries, for which predicate(key, value) is true
+        :return: Amount of removed entries
+        """
+        keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Get cache size and counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ByteLRUCache:
+    """
+    In-process cache of serialized values, bounded by their total size in bytes, with least recently used eviction.
+
+    Entries can be put into groups, so all entries related to the same object are invalidated at once.
+    Not thread-safe, meant to be used from the event loop.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param max_bytes: Maximum total size of cached values. Least recently used entries are evicted above it
+        """
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[bytes, Hashable]] = OrderedDict()
+        self._groups: dict[Hashable, set[Hashable]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> bytes | None:
+        """
+        Get value by key
+        :return: Cached value, or None on miss
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: bytes, group: Hashable = None) -> None:
+        """Put value to cache in given group, evicting least recently used entries if cache is full"""
+        if len(value) > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = (value, group)
+        self._groups.setdefault(group, set()).add(key)
+        self.size_bytes += len(value)
+
+        while self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_group(self, group: Hashable) -> int:
+        """
+        Remove all entries of group
+        :return: Amount of removed entries
+        """
+        keys = self._groups.get(group, set()).copy()
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._entries.clear()
+        self._groups.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        value, group = entry
+        self.size_bytes -= len(value)
+        keys = self._groups[group]
+        keys.discard(key)
+        if not keys:
+            del self._groups[group]
+
+    def stats(self) -> dict:
+        """Get cache size and counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
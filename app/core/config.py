@@ -1,12 +1,119 @@
-import os
-from pydantic_settings import BaseSettings
-from dotenv import load_dotenv
-
-load_dotenv()
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
-    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
+    # Settings are read from environment, then from .env file. Other variables in .env file are ignored
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    OPENAI_API_KEY: str
+    # Base URL of OpenAI compatible API, e.g. local stub server for benchmarks
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+
+    # JWT authorization. Secret key is generated by generate_jwt_secret.py
+    JWT_SECRET_KEY: str
+    JWT_ALGORITHM: str = "HS256"
+
+    LOG_LEVEL: str = "INFO"
+
+    # Startup warm-up: connections of async pool are opened, OpenAPI schema is built and versions of
+    # WARMUP_PRIME_POSTS newest posts are cached before the first request
+    STARTUP_WARMUP: bool = True
+    WARMUP_PRIME_POSTS: int = 1000
+
+    # Prometheus metrics, recorded by middleware and served on /metrics
+    METRICS_ENABLED: bool = True
+
+    # Database connection
+    DATABASE_URL: str = "sqlite:///./db/database.db"
+
+    # SQLite storage profile, one of "balanced", "durable", "legacy". See app/database.py for profile values.
+    # Any of SQLITE_* settings below overrides corresponding value of the profile, if set.
+    STORAGE_PROFILE: str = "balanced"
+    SQLITE_JOURNAL_MODE: str | None = None
+    SQLITE_SYNCHRONOUS: str | None = None
+    SQLITE_MMAP_SIZE: int | None = None  # Bytes
+    SQLITE_CACHE_SIZE: int | None = None  # Pages if positive, KiB if negative
+    SQLITE_BUSY_TIMEOUT: int | None = None  # Milliseconds
+
+    # Connection pool
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # Seconds
+
+    # Query instrumentation. Share of requests, whose database statements are counted and checked for N+1 queries,
+    # disabled by default. Server-Timing header of tracked responses exposes database time to clients, so it is
+    # opt-in too. Statements slower than SLOW_QUERY_MS are logged regardless of sampling.
+    QUERY_STATS_SAMPLE_RATE: float = 0
+    QUERY_STATS_SERVER_TIMING: bool = False
+    SLOW_QUERY_MS: float = 100
+    N_PLUS_ONE_THRESHOLD: int = 10  # Executions of identical statement within one request
+
+    # Request profiling. Request with X-Profile header equal to PROFILING_TOKEN is answered with its profile,
+    # unset token disables on-demand profiling. Share of requests, given by PROFILING_SAMPLE_RATE, is sampled, and
+    # profiles of PROFILING_MAX_STORED slowest of them are kept in PROFILING_DIR.
+    PROFILING_TOKEN: str | None = None
+    PROFILING_SAMPLE_RATE: float = 0
+    PROFILING_INTERVAL_MS: float = 5  # Stack sampling interval
+    PROFILING_DIR: str = "./profiles"
+    PROFILING_MAX_STORED: int = 20
+
+    # Pagination
+    DEFAULT_PAGE_SIZE: int = 20
+    MAX_PAGE_SIZE: int = 100
+
+    # Comments daily breakdown
+    BREAKDOWN_MAX_ITEMS_PER_DAY: int = 1000
+
+    # Amount of rows fetched at once by server-side cursors of streamed responses
+    STREAM_BATCH_SIZE: int = 500
+
+    # Moderation results cache. Backend is one of "memory" (per process), "sqlite" (shared by workers), "none"
+    MODERATION_CACHE_BACKEND: str = "memory"
+    MODERATION_CACHE_MAX_SIZE: int = 10000
+    MODERATION_CACHE_TTL: int = 24 * 60 * 60  # Seconds
+
+    # Concurrent moderation calls are coalesced into one API request of up to MODERATION_BATCH_MAX_SIZE contents,
+    # waiting at most MODERATION_BATCH_MAX_WAIT_MS for batch to fill. Batch size of 1 disables batching.
+    MODERATION_BATCH_MAX_SIZE: int = 32
+    MODERATION_BATCH_MAX_WAIT_MS: float = 10
+
+    # Maximum amount of comments in one bulk creation request
+    COMMENT_BATCH_MAX_SIZE: int = 100
+
+    # Shared HTTP client for OpenAI API calls. HTTP2 requires h2 package
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30  # Seconds
+    HTTP_CONNECT_TIMEOUT: float = 5  # Seconds
+    HTTP_TIMEOUT: float = 30  # Seconds, for read, write and pool acquire
+    HTTP2: bool = False
+
+    # Password hashing. Changed cost is applied to existing passwords on next login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 16  # Hashing calls waiting for worker, before answering with 503
+
+    # Cache of post versions, used for ETags of post and comments. TTL bounds how long other workers may answer
+    # 304 Not Modified for changed post
+    POST_VERSION_CACHE_MAX_SIZE: int = 100000
+    POST_VERSION_CACHE_TTL: int = 5  # Seconds
+    # Memory for serialized post and comments responses, cached by post version. 0 disables caching
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Cache of authenticated users. TTL bounds how long other workers may see changed or deleted user
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL: int = 60  # Seconds
+
+    # Maximum amount of auto-replies generated by LLM concurrently
+    AUTO_REPLY_WORKERS: int = 4
+    # Failed generation of auto-reply is retried with exponential backoff, starting from AUTO_REPLY_RETRY_DELAY,
+    # and is given up after AUTO_REPLY_MAX_ATTEMPTS. Reply claimed by worker isn't generated by others for
+    # AUTO_REPLY_CLAIM_TIMEOUT, so reply of crashed worker is generated after it
+    AUTO_REPLY_MAX_ATTEMPTS: int = 5
+    AUTO_REPLY_RETRY_DELAY: float = 60  # Seconds
+    AUTO_REPLY_CLAIM_TIMEOUT: float = 300  # Seconds
+    # Maximum amount of delayed auto-replies published in one transaction
+    REPLY_SCHEDULER_BATCH_SIZE: int = 100
 
 
 settings = Settings()
@@ -0,0 +1,24 @@
+from fastapi import Request
+
+
+def weak_etag(*parts) -> str:
+    """
+    Build weak entity tag from parts, identifying version of a resource
+    :return: ETag header value, e.g. W/"post-1-3"
+    """
+    return 'W/"{}"'.format("-".join(str(part) for part in parts))
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Check, if If-None-Match header of request matches entity tag, so response can be 304 Not Modified.
+    Tags are compared weakly, as required for If-None-Match
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque_tag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(","))
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised, when bounded executor has no free worker and its queue is full"""
+
+
+class BoundedExecutor:
+    """
+    Thread pool for CPU heavy calls from the event loop, with limited amount of waiting calls.
+
+    Calls above `max_workers` running and `max_queue` waiting are rejected right away instead of piling up,
+    so callers can answer with 503 while latency of accepted calls stays bounded. Call keeps its slot until its thread
+    finishes, even if the caller stops waiting, e.g. when client disconnects.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, thread_name_prefix: str = ""):
+        """
+        :param max_workers: Amount of threads
+        :param max_queue: Maximum amount of calls waiting for free thread
+        :param thread_name_prefix: Prefix of thread names, for debugging
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._in_flight = 0
+        # Slots are released by worker threads
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        """Amount of running and waiting calls"""
+        return self._in_flight
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run function in thread pool and wait for its result
+        :raises ExecutorSaturatedError: If all threads are busy and queue is full
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise ExecutorSaturatedError(f"{self._in_flight} calls are already running or waiting")
+            self._in_flight += 1
+
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Cancelled caller cancels only the call, that is still waiting, so running one keeps its slot till it ends
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future: Future | None = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
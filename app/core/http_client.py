@@ -0,0 +1,51 @@
+import importlib.util
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def http_timeout() -> httpx.Timeout:
+    """Timeouts of outbound API calls from settings"""
+    return httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create pooled HTTP client, shared by services calling OpenAI API.
+
+    Client keeps connections alive between calls, so only the first call to the host pays for TCP and TLS handshakes.
+    Should be created and closed in application lifespan.
+    :return: HTTP client with limits and timeouts from settings
+    """
+    http2 = settings.HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2 is enabled, but h2 package is not installed. Falling back to HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=http_timeout(),
+        limits=httpx.Limits(max_connections=settings.HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY),
+    )
+
+
+@asynccontextmanager
+async def use_http_client(client: httpx.AsyncClient | None) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Yield shared client, if given. Otherwise, yield short-lived client, closed on exit,
+    e.g. when service is used outside of application lifespan
+    """
+    if client is not None:
+        yield client
+        return
+
+    async with httpx.AsyncClient(timeout=http_timeout()) as temporary_client:
+        yield temporary_client
@@ -0,0 +1,155 @@
+import time
+from typing import Callable, Iterator
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Latency buckets in seconds, from cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Metrics of the app only, without process and platform collectors of the default registry
+REGISTRY = CollectorRegistry()
+
+
+class CacheCollector(Collector):
+    """
+    Collector of metrics of application caches. They count hits and misses themselves, so metrics are read from
+    their stats on every scrape instead of being updated on every lookup
+    """
+
+    def __init__(self):
+        self._caches: dict[str, Callable[[], dict]] = {}
+
+    def add(self, cache: str, stats: Callable[[], dict]) -> None:
+        """
+        Export metrics of cache
+        :param cache: Value of cache label
+        :param stats: Function, returning `stats()` of TTLCache, ByteLRUCache or ModerationCache
+        """
+        self._caches[cache] = stats
+
+    def collect(self) -> Iterator[Metric]:
+        entries = GaugeMetricFamily("cache_entries", "Entries in cache", labels=["cache"])
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Cache evictions", labels=["cache"])
+        hit_ratio = GaugeMetricFamily("cache_hit_ratio", "Share of cache lookups, that were hits, since start",
+                                      labels=["cache"])
+        for cache, get_stats in self._caches.items():
+            stats = get_stats()
+            size = stats.get("size", stats.get("entries"))
+            if size is not None:
+                entries.add_metric([cache], size)
+            hits.add_metric([cache], stats.get("hits", 0))
+            misses.add_metric([cache], stats.get("misses", 0))
+            evictions.add_metric([cache], stats.get("evictions", 0))
+            hit_ratio.add_metric([cache], stats.get("hit_rate", 0.0))
+        yield from (entries, hits, misses, evictions, hit_ratio)
+
+
+# Incoming requests, labelled by route template, e.g. /api/posts/{post_id}, so amount of series is bounded
+http_requests_total = Counter("http_requests_total", "Handled HTTP requests",
+                              ["method", "route", "status"], registry=REGISTRY)
+http_request_duration_seconds = Histogram("http_request_duration_seconds", "HTTP request handling time",
+                                          ["method", "route"], buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+http_requests_in_progress = Gauge("http_requests_in_progress", "HTTP requests being handled",
+                                  ["method", "route"], registry=REGISTRY)
+
+# Outbound OpenAI API calls. Status is HTTP status code, or "error" if no response was received
+outbound_requests_total = Counter("outbound_requests_total", "Outbound API calls",
+                                  ["service", "status"], registry=REGISTRY)
+outbound_request_duration_seconds = Histogram("outbound_request_duration_seconds", "Outbound API call time",
+                                              ["service"], buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+moderation_batch_size = Histogram("moderation_batch_size", "Contents sent in one moderation API call",
+                                  buckets=(1, 2, 4, 8, 16, 32, 64, 128), registry=REGISTRY)
+
+# Password hashing in password executor, measured in worker thread
+password_hash_duration_seconds = Histogram("password_hash_duration_seconds", "bcrypt hashing or verification time",
+                                           ["operation"], buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+password_hash_rejected_total = Counter("password_hash_rejected_total",
+                                       "Password hashing calls rejected, as password executor is saturated",
+                                       registry=REGISTRY)
+# Read from password executor on every scrape, see main module
+password_hash_in_progress = Gauge("password_hash_in_progress", "Password hashing calls running or waiting",
+                                  registry=REGISTRY)
+
+# Database statements of sampled requests, see query_stats module
+db_queries_per_request = Histogram("db_queries_per_request", "Database statements executed by one request",
+                                   ["route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100), registry=REGISTRY)
+db_duration_per_request_seconds = Histogram("db_duration_per_request_seconds",
+                                            "Time of database statements executed by one request", ["route"],
+                                            buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+db_n_plus_one_total = Counter("db_n_plus_one_total",
+                              "Requests, that repeated identical statement above N+1 threshold", ["route"],
+                              registry=REGISTRY)
+
+# Application caches, read from their stats on every scrape
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+def record_outbound_call(service: str, status: int | str, seconds: float) -> None:
+    """
+    Record outbound API call
+    :param service: Calling service, e.g. "moderation"
+    :param status: HTTP status code of response, or "error" if no response was received
+    :param seconds: Call duration
+    """
+    outbound_requests_total.labels(service=service, status=status).inc()
+    outbound_request_duration_seconds.labels(service=service).observe(seconds)
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Find template of route, that handles request, e.g. /api/posts/{post_id}, before the request is routed.
+    Result is saved in scope, so other middlewares don't search for it again
+    :return: Route path template, or "unmatched" if no route matches request
+    """
+    if "route_template" not in scope:
+        scope["route_template"] = "unmatched"
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                scope["route_template"] = route.path
+                break
+    return scope["route_template"]
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware, recording latency, status and amount of in-progress requests per route.
+
+    Route is found before the request is handled, so in-progress gauge has route label too. Requests, not matching
+    any route, are labelled with "unmatched" instead of their path, to keep amount of series bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method=method, route=route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration_seconds.labels(method=method, route=route).observe(time.perf_counter() - started)
+            http_requests_total.labels(method=method, route=route, status=status).inc()
+            in_progress.dec()
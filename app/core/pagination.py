@@ -0,0 +1,33 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+
+
+def encode_cursor(values: dict) -> str:
+    """
+    Encode keyset position into opaque cursor string
+    :param values: Dict with values of ordering columns of the last returned row
+    :return: URL-safe cursor string
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *keys: str) -> dict:
+    """
+    Decode cursor string, previously created by `encode_cursor`
+    :param cursor: Cursor string from request
+    :param keys: Keys, that cursor must contain
+    :return: Dict with values of ordering columns
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, dict) or any(key not in values for key in keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return values
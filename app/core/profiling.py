@@ -0,0 +1,252 @@
+import asyncio
+import cProfile
+import heapq
+import hmac
+import io
+import logging
+import marshal
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_FORMAT_HEADER = "x-profile-format"
+PROFILE_FORMATS = ("text", "pstats", "collapsed")
+# Functions shown in text report, sorted by cumulative time
+TEXT_REPORT_LIMIT = 60
+
+
+def _frame_label(frame) -> str:
+    """Label of stack frame in collapsed stacks, e.g. comment.py:get_comments_daily_breakdown"""
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}".replace(";", ":")
+
+
+def _coroutine_stack(coroutine) -> list[str]:
+    """Labels of frames of suspended coroutine and coroutines it awaits, outermost first"""
+    stack = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None)
+    return stack
+
+
+class StackSampler:
+    """
+    Sampling profiler of one request, running in its own thread.
+
+    Every interval it records stack of the event loop thread, if the request task is running, or the await chain of
+    the request task with "<waiting>" frame, if task is suspended, e.g. waiting for database or API. So samples show
+    where wall time of the request goes, not only CPU time. Work done in other threads and tasks isn't sampled.
+    """
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.stacks: Counter[str] = Counter()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def __enter__(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if asyncio.current_task(self._loop) is self._task:
+                    frame = sys._current_frames().get(self._thread_id)
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.reverse()
+                else:
+                    stack = _coroutine_stack(self._task.get_coro()) + ["<waiting>"]
+            except Exception:
+                # Frames change under the sampler, so skip sample, that was read in the middle of a change
+                continue
+            self.stacks[";".join(stack)] += 1
+
+    def collapsed(self) -> str:
+        """Samples in collapsed stacks format, accepted by flamegraph.pl and speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """
+    Bounded on-disk store of profiles of the slowest sampled requests.
+
+    Keeps at most `max_profiles` files. When it is full, profile of a slower request replaces profile of the fastest
+    stored one, and profiles of faster requests are dropped. Duration is a part of file name, so store is restored
+    from directory after restart.
+    """
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        # Min-heap of (duration, file name), so the fastest stored profile is evicted first
+        self._heap: list[tuple[float, str]] = []
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            match = re.match(r"(\d+)ms-", name)
+            if match:
+                self._heap.append((int(match.group(1)) / 1000, name))
+        heapq.heapify(self._heap)
+
+    def save(self, duration: float, method: str, route: str, profile: str) -> str | None:
+        """
+        Save profile, if the request is among the slowest ones. Does blocking file I/O, so call it from a thread
+        :return: File name of saved profile, or None if it wasn't slow enough
+        """
+        with self._lock:
+            if len(self._heap) >= self.max_profiles:
+                if duration <= self._heap[0][0]:
+                    return None
+                _, evicted = heapq.heappop(self._heap)
+                try:
+                    os.remove(os.path.join(self.directory, evicted))
+                except FileNotFoundError:
+                    pass
+
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+            name = f"{int(duration * 1000):08d}ms-{time.time_ns()}-{method}-{slug}.collapsed"
+            with open(os.path.join(self.directory, name), "w", encoding="utf-8") as file:
+                file.write(profile)
+            heapq.heappush(self._heap, (duration, name))
+            return name
+
+    def list(self) -> list[str]:
+        """File names of stored profiles, the slowest first"""
+        with self._lock:
+            return [name for _, name in sorted(self._heap, reverse=True)]
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware, profiling requests on demand and sampling the slowest ones.
+
+    Request with X-Profile header equal to PROFILING_TOKEN is profiled, and profile is returned instead of its
+    response, with original status in X-Profile-Status header. X-Profile-Format header selects the profile:
+     - text: cProfile report, sorted by cumulative time (default)
+     - pstats: binary cProfile stats, loadable with `pstats.Stats` or snakeviz
+     - collapsed: stack samples in collapsed format for flame graphs
+    cProfile traces the whole event loop thread, so requests, handled at the same time, get into the profile too.
+
+    With PROFILING_SAMPLE_RATE above 0, that share of requests is sampled by StackSampler, and profiles of
+    PROFILING_MAX_STORED slowest of them are kept in PROFILING_DIR.
+    """
+
+    def __init__(self, app: ASGIApp, store: ProfileStore | None = None):
+        self.app = app
+        self.store = store
+        # cProfile can't trace two requests at once in one thread
+        self._cprofile_active = False
+
+    def _is_authorized(self, headers: Headers) -> bool:
+        token = headers.get(PROFILE_HEADER)
+        return bool(settings.PROFILING_TOKEN) and token is not None and hmac.compare_digest(
+            token.encode(), settings.PROFILING_TOKEN.encode())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if PROFILE_HEADER in headers and self._is_authorized(headers):
+            await self._profile_on_demand(scope, receive, send, headers.get(PROFILE_FORMAT_HEADER, "text"))
+        elif self.store is not None and random.random() < settings.PROFILING_SAMPLE_RATE:
+            await self._profile_sampled(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _profile_on_demand(self, scope: Scope, receive: Receive, send: Send, profile_format: str) -> None:
+        """Handle request under profiler and answer with profile instead of its response"""
+        if profile_format not in PROFILE_FORMATS:
+            await self._respond(send, 400, f"X-Profile-Format must be one of {', '.join(PROFILE_FORMATS)}\n".encode(),
+                                "text/plain; charset=utf-8")
+            return
+        if profile_format != "collapsed" and self._cprofile_active:
+            await self._respond(send, 409, b"Another request is being profiled\n", "text/plain; charset=utf-8")
+            return
+
+        status = 500
+
+        async def capture(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        started = time.perf_counter()
+        if profile_format == "collapsed":
+            with StackSampler(settings.PROFILING_INTERVAL_MS) as sampler:
+                await self.app(scope, receive, capture)
+            body, content_type = sampler.collapsed().encode(), "text/plain; charset=utf-8"
+        else:
+            profiler = cProfile.Profile()
+            self._cprofile_active = True
+            profiler.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profiler.disable()
+                self._cprofile_active = False
+
+            if profile_format == "pstats":
+                body, content_type = marshal.dumps(pstats.Stats(profiler).stats), "application/octet-stream"
+            else:
+                report = io.StringIO()
+                pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(TEXT_REPORT_LIMIT)
+                body, content_type = report.getvalue().encode(), "text/plain; charset=utf-8"
+
+        duration = time.perf_counter() - started
+        await self._respond(send, 200, body, content_type, {
+            "x-profile-status": str(status),
+            "x-profile-duration-ms": f"{duration * 1000:.1f}",
+        })
+
+    async def _profile_sampled(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle request under stack sampler and store its profile, if it is among the slowest ones"""
+        started = time.perf_counter()
+        with StackSampler(settings.PROFILING_INTERVAL_MS) as sampler:
+            await self.app(scope, receive, send)
+        duration = time.perf_counter() - started
+
+        # File is written in a thread, so sampled request doesn't block others
+        name = await asyncio.to_thread(self.store.save, duration, scope["method"], route_template(scope),
+                                       sampler.collapsed())
+        if name is not None:
+            logger.info("Saved profile of %s %s, %.1f ms, to %s",
+                        scope["method"], scope["path"], duration * 1000, name)
+
+    @staticmethod
+    async def _respond(send: Send, status: int, body: bytes, content_type: str,
+                       extra_headers: dict[str, str] | None = None) -> None:
+        headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+        headers += [(name.encode(), value.encode()) for name, value in (extra_headers or {}).items()]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
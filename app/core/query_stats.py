@@ -0,0 +1,163 @@
+import logging
+import random
+import re
+import time
+from collections import Counter as CounterDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import db_duration_per_request_seconds, db_n_plus_one_total, db_queries_per_request, route_template
+
+logger = logging.getLogger(__name__)
+
+# Lists of placeholders, e.g. of expanded IN clause, are collapsed, so statements differing only by amount of
+# values have the same shape
+_PLACEHOLDERS_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@dataclass
+class QueryStats:
+    """Database statements executed within one request or block of code"""
+    count: int = 0
+    duration: float = 0  # Seconds
+    shapes: CounterDict = field(default_factory=CounterDict)
+    method: str = ""
+    route: str = ""
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.shapes[_PLACEHOLDERS_LIST.sub("(?)", statement)] += 1
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """Statement shapes, executed at least `threshold` times, i.e. probable N+1 queries"""
+        return {shape: amount for shape, amount in self.shapes.items() if amount >= threshold}
+
+
+# Stats of the current request. Listeners run in the greenlet of async session, that inherits the context
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+# Functions, called with stats of every finished tracked request, e.g. by tests
+_observers: list[Callable[[QueryStats], None]] = []
+
+
+def redact_parameters(parameters) -> str:
+    """Describe statement parameters by their types only, so logs don't contain user data"""
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: <{type(value).__name__}>" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(f"<{type(value).__name__}>" for value in parameters or ()) + ")"
+
+
+def instrument_engine(sync_engine: Engine) -> None:
+    """
+    Register listeners, timing every statement of the engine. Statement is added to stats of the current request,
+    if it is tracked, and is logged with redacted parameters, if it is slower than SLOW_QUERY_MS
+    :param sync_engine: Engine to instrument. For async engine pass its `sync_engine`
+    """
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def record_query(connection, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - connection.info["query_started_at"].pop()
+
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(statement, duration)
+
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning("Slow query %.1f ms: %s; parameters: %s",
+                           duration * 1000, statement, redact_parameters(parameters))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def discard_timer(exception_context):
+        if exception_context.connection is not None:
+            started_at = exception_context.connection.info.get("query_started_at")
+            if started_at:
+                started_at.pop()
+
+
+@contextmanager
+def collect_queries() -> Iterator[QueryStats]:
+    """Collect stats of statements, executed within the block, e.g. by background task"""
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+@contextmanager
+def track_requests() -> Iterator[list[QueryStats]]:
+    """
+    Collect query stats of every request, finished within the block, regardless of sample rate.
+    Used by tests to assert query budgets of endpoints
+    """
+    finished: list[QueryStats] = []
+    _observers.append(finished.append)
+    try:
+        yield finished
+    finally:
+        _observers.remove(finished.append)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware, counting database statements and their time per request.
+
+    Share of requests, given by QUERY_STATS_SAMPLE_RATE, and every request within `track_requests` block are tracked.
+    Statement shapes of tracked request, repeated at least N_PLUS_ONE_THRESHOLD times, are logged as probable N+1
+    queries. With QUERY_STATS_SERVER_TIMING enabled, response of tracked request gets Server-Timing header with
+    database time and amount of statements.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (_observers or random.random() < settings.QUERY_STATS_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and settings.QUERY_STATS_SERVER_TIMING:
+                # Statements of streamed body are executed after headers are sent, so they are not included here
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+            await send(message)
+
+        with collect_queries() as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self._finish(scope, stats)
+
+    @staticmethod
+    def _finish(scope: Scope, stats: QueryStats) -> None:
+        """Record stats of finished request and report probable N+1 queries"""
+        stats.method = scope["method"]
+        stats.route = route_template(scope)
+        db_queries_per_request.labels(route=stats.route).observe(stats.count)
+        db_duration_per_request_seconds.labels(route=stats.route).observe(stats.duration)
+
+        repeated = stats.repeated(settings.N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            db_n_plus_one_total.labels(route=stats.route).inc()
+            for shape, amount in repeated.items():
+                logger.warning("Probable N+1 query in %s %s: statement executed %s times: %s",
+                               stats.method, stats.route, amount, shape)
+
+        for observer in _observers:
+            observer(stats)
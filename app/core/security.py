@@ -1,4 +1,5 @@
-import os
+import time
+from dataclasses import dataclass
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
@@ -6,22 +7,58 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
-from dotenv import load_dotenv
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from ..database import get_db
+from .cache import TTLCache
+from .config import settings
+from .executor import BoundedExecutor, ExecutorSaturatedError
+from .metrics import password_hash_duration_seconds, password_hash_rejected_total
+from ..database import get_async_db
 from ..models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-load_dotenv()
+# Hashes with other cost than configured one are rehashed on successful login
+pwd_context = CryptContext(schemes=["bcrypt"],
+                           deprecated="auto",
+                           bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+                           bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+                           bcrypt__max_rounds=settings.BCRYPT_ROUNDS)
 
+# bcrypt takes hundreds of milliseconds of CPU, so it is run outside of the event loop with limited queue
+password_executor = BoundedExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                    max_queue=settings.PASSWORD_HASH_QUEUE_SIZE,
+                                    thread_name_prefix="bcrypt")
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-ALGORITHM = os.getenv("JWT_ALGORITHM")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@dataclass(frozen=True)
+class CurrentUser:
+    """Snapshot of authenticated user, that is cached between requests instead of ORM object bound to a session"""
+    id: int
+    username: str
+    email: str
+    auto_respond_to_comments: bool | None
+    auto_respond_time: int | None
+
+    @classmethod
+    def from_model(cls, user: User) -> "CurrentUser":
+        return cls(id=user.id,
+                   username=user.username,
+                   email=user.email,
+                   auto_respond_to_comments=user.auto_respond_to_comments,
+                   auto_respond_time=user.auto_respond_time)
+
+
+# Authenticated users by username from token subject, so authentication doesn't query database on every request.
+# Cache is per process: with several workers changed or deleted user may be seen by other workers up to TTL.
+user_cache = TTLCache(max_size=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL)
+
+
+def invalidate_cached_user(username: str) -> None:
+    """Remove user from authenticated users cache. Call after user is changed or deleted"""
+    user_cache.delete(username)
 
 
 def verify_password(plain_password, hashed_password):
@@ -32,6 +69,40 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+def _timed_password_call(operation: str, func, *args):
+    """Call password hashing function, recording its time in worker thread, without time waiting for the thread"""
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        password_hash_duration_seconds.labels(operation=operation).observe(time.perf_counter() - started)
+
+
+async def _run_password_call(operation: str, func, *args):
+    """Run password hashing call in password executor, answering with 503 if it is saturated"""
+    try:
+        return await password_executor.run(_timed_password_call, operation, func, *args)
+    except ExecutorSaturatedError:
+        password_hash_rejected_total.inc()
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Server is busy, try again later",
+                            headers={"Retry-After": "1"})
+
+
+async def hash_password(password: str) -> str:
+    """Hash password in password executor"""
+    return await _run_password_call("hash", pwd_context.hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verify password in password executor
+    :return: Tuple of verification result and new hash, if password is valid and its hash uses outdated cost
+    """
+    return await _run_password_call("verify", pwd_context.verify_and_update, plain_password,
+                                   hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
 
@@ -41,24 +112,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(db: AsyncSession = Depends(get_async_db),
+                           token: str = Depends(oauth2_scheme)) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+
+    current_user = user_cache.get(username)
+    if current_user is not None:
+        return current_user
+
+    user = await db.scalar(select(User).filter(User.username == username))
     if user is None:
         raise credentials_exception
-    return user
+
+    current_user = CurrentUser.from_model(user)
+    user_cache.set(username, current_user)
+    return current_user
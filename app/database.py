@@ -1,10 +1,112 @@
-from sqlalchemy import create_engine, MetaData
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+
+from sqlalchemy import create_engine, event, make_url, text, MetaData
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .core.config import settings
+from .core.query_stats import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA values for SQLite storage profiles.
+# "balanced" lets readers work alongside a writer and waits on locks instead of failing with "database is locked",
+# "durable" also syncs WAL on every commit, "legacy" keeps SQLite defaults (rollback journal, no busy timeout).
+STORAGE_PROFILES = {
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "busy_timeout": 5000,
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -16 * 1024,
+        "busy_timeout": 10000,
+    },
+    "legacy": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -2000,
+        "busy_timeout": 0,
+    },
+}
+
+
+def get_storage_profile() -> dict:
+    """
+    Get PRAGMA values of storage profile from settings, with overrides of individual values applied
+    :return: Dict with PRAGMA names and values
+    """
+    if settings.STORAGE_PROFILE not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {settings.STORAGE_PROFILE!r}, "
+                         f"expected one of {', '.join(STORAGE_PROFILES)}")
+
+    profile = dict(STORAGE_PROFILES[settings.STORAGE_PROFILE])
+    overrides = {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+    }
+    profile.update({pragma: value for pragma, value in overrides.items() if value is not None})
+    return profile
+
+
+def apply_storage_profile(sync_engine: Engine) -> None:
+    """
+    Register connect hook, that applies storage profile PRAGMAs to every new SQLite connection of the engine
+    :param sync_engine: Engine to register hook for. For async engine pass its `sync_engine`
+    """
+    profile = get_storage_profile()
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+def _engine_kwargs(url: str, poolclass) -> dict:
+    """Pool arguments for file based SQLite database. In-memory database is left with SQLAlchemy defaults"""
+    database = make_url(url).database
+    if not database or database == ":memory:":
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
 
-DATABASE_URL = 'sqlite:///./db/database.db'
+DATABASE_URL = settings.DATABASE_URL
+ASYNC_DATABASE_URL = make_url(DATABASE_URL).set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+
+# Sync engine is kept for alembic, table creation and scripts outside the request cycle
+engine = create_engine(DATABASE_URL,
+                       connect_args={"check_same_thread": False},
+                       **_engine_kwargs(DATABASE_URL, QueuePool))
+apply_storage_profile(engine)
+instrument_engine(engine)
+
+# Async engine is used by request handlers, so database I/O doesn't block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool))
+apply_storage_profile(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
-engine = create_engine(DATABASE_URL)
 metadata = MetaData()
 
 Base = declarative_base(metadata=metadata)
@@ -12,9 +114,47 @@ Base = declarative_base(metadata=metadata)
 # metadata.create_all(engine)
 
 
+def log_storage_profile() -> dict:
+    """
+    Read effective PRAGMA values from database and log them
+    :return: Dict with PRAGMA names and effective values
+    """
+    with engine.connect() as connection:
+        effective = {pragma: connection.execute(text(f"PRAGMA {pragma}")).scalar()
+                     for pragma in get_storage_profile()}
+
+    logger.info("SQLite storage profile %r for %s: %s, pool size %s (max overflow %s)",
+                settings.STORAGE_PROFILE,
+                engine.url.render_as_string(hide_password=True),
+                ", ".join(f"{pragma}={value}" for pragma, value in effective.items()),
+                settings.DB_POOL_SIZE,
+                settings.DB_MAX_OVERFLOW)
+    return effective
+
+
+async def prewarm_pool(size: int) -> None:
+    """
+    Open connections of async engine at once and return them to the pool, so the first requests don't wait for
+    connecting and applying PRAGMAs
+    :param size: Amount of connections, up to pool size, as the rest would be closed on return
+    """
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(*[stack.enter_async_context(async_engine.connect()) for _ in range(size)])
+
+
 def get_db():
     db = Session(engine)
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """Session factory for work, that outlives request session, like streamed responses"""
+    return AsyncSessionLocal
@@ -1,12 +1,110 @@
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .routers import auth_router, post_router, user_router, comment_router
-from .database import Base, engine
+from .routers import auth_router, post_router, user_router, comment_router, search_router, metrics_router
+from .database import engine, async_engine, get_async_sessionmaker, log_storage_profile, prewarm_pool
+from .core.config import settings
+from .core.http_client import create_http_client
+from .core.metrics import MetricsMiddleware, cache_collector, password_hash_in_progress
+from .core.profiling import ProfileStore, ProfilingMiddleware
+from .core.query_stats import QueryStatsMiddleware
+from .core.security import password_executor, user_cache
+from .services.auto_reply_to_comment import auto_reply_to_comment_service
+from .services.llm_moderation import moderation_service
+from .services.post_versions import post_versions
+from .services.reply_scheduler import reply_scheduler
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(app: FastAPI) -> dict[str, float]:
+    """
+    Do lazy initialisation before the first requests, so they don't pay for it
+    :param app: Application
+    :return: Seconds spent on every step
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    await prewarm_pool(settings.DB_POOL_SIZE)
+    timings["pool"] = time.perf_counter() - started
+
+    # OpenAPI schema is built from pydantic models of all routes on the first request to docs
+    started = time.perf_counter()
+    app.openapi()
+    timings["openapi"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    # Session factory is taken from dependency overrides, so tests prime caches from the test database
+    session_factory = app.dependency_overrides.get(get_async_sessionmaker, get_async_sessionmaker)()
+    async with session_factory() as db:
+        await post_versions.prime(db, min(settings.WARMUP_PRIME_POSTS, settings.POST_VERSION_CACHE_MAX_SIZE))
+    timings["caches"] = time.perf_counter() - started
+
+    return timings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown. Database schema is managed by alembic migrations"""
+    started = time.perf_counter()
+    log_storage_profile()
+
+    # One pooled client for all OpenAI calls, so connections are reused between requests
+    http_client = create_http_client()
+    moderation_service.http_client = http_client
+    auto_reply_to_comment_service.http_client = http_client
+
+    # Resume delayed auto-replies, that were pending on shutdown
+    await reply_scheduler.start()
+
+    app.state.startup_timings = await warm_up(app) if settings.STARTUP_WARMUP else {}
+    app.state.startup_timings["total"] = time.perf_counter() - started
+    logger.info("Startup finished in %s",
+                ", ".join(f"{step} {seconds * 1000:.1f} ms" for step, seconds in app.state.startup_timings.items()))
+
+    yield
+
+    await reply_scheduler.stop()
+    logger.info("Authenticated users cache: %s", user_cache.stats())
+    logger.info("Post versions and responses cache: %s", post_versions.stats())
+    moderation_service.http_client = None
+    auto_reply_to_comment_service.http_client = None
+    await http_client.aclose()
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def register_metrics() -> None:
+    """Export metrics of caches and password executor, read from their own counters on every scrape"""
+    cache_collector.add("users", user_cache.stats)
+    cache_collector.add("post_versions", lambda: post_versions.stats()["versions"])
+    cache_collector.add("responses", lambda: post_versions.stats()["responses"])
+    if moderation_service.cache is not None:
+        cache_collector.add("moderation", moderation_service.cache.stats)
+    password_hash_in_progress.set_function(lambda: password_executor.in_flight)
+
 
 # Init main FastAPI app object
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Database statements per request, Server-Timing header and N+1 detection
+app.add_middleware(QueryStatsMiddleware)
+
+if settings.METRICS_ENABLED:
+    # Latency, status and in-progress requests per route template
+    app.add_middleware(MetricsMiddleware)
+    register_metrics()
+    app.include_router(metrics_router, tags=['metrics'])
 
-# Initiate database tables
-Base.metadata.create_all(engine)
+if settings.PROFILING_TOKEN or settings.PROFILING_SAMPLE_RATE > 0:
+    # Outermost, so profiles include other middlewares
+    profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_STORED) \
+        if settings.PROFILING_SAMPLE_RATE > 0 else None
+    app.add_middleware(ProfilingMiddleware, store=profile_store)
 
 
 # Include routers
@@ -14,3 +112,4 @@ app.include_router(auth_router, prefix='/api', tags=['authentication'])
 app.include_router(post_router, prefix='/api', tags=['posts'])
 app.include_router(user_router, prefix='/api', tags=['users'])
 app.include_router(comment_router, prefix='/api', tags=['comments'])
+app.include_router(search_router, prefix='/api', tags=['search'])
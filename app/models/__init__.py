@@ -1,3 +1,5 @@
 from .user import User, UserProfile
 from .post import Post
-from .comment import Comment, BlockedComment
+from .comment import Comment, BlockedComment, CommentDailyStats, ScheduledReply
+from .moderation import ModerationCacheEntry
+from .search import SEARCH_INDEX_DDL, SEARCH_INDEX_REBUILD, SEARCH_INDEX_DROP
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime, Date, Index
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -17,6 +17,11 @@ class Comment(Base):
     owner = relationship("User", back_populates="comments")
     post = relationship("Post", back_populates="comments")
 
+    __table_args__ = (
+        # Serves comments listing of a post, ordered by creation time
+        Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+    )
+
     def to_dict(self):
         """Represent comment attributes as dict, excluding ones for internal use"""
         return {c.name: getattr(self, c.name) for c in self.__table__.columns
@@ -42,3 +47,39 @@ class BlockedComment(Base):
         """Represent comment attributes as dict, excluding ones for internal use"""
         return {c.name: getattr(self, c.name) for c in self.__table__.columns
                 if not c.name.startswith("_")}
+
+
+class CommentDailyStats(Base):
+    """
+    Rollup with amount of comments and blocked comments for each post and day.
+
+    Maintained in the same transaction with comments creation and deletion, so analytics doesn't need to scan comments.
+    """
+
+    __tablename__ = "comment_daily_stats"
+
+    date = Column(Date, primary_key=True)
+    post_id = Column(Integer, primary_key=True)
+    comment_count = Column(Integer, nullable=False, default=0)
+    blocked_count = Column(Integer, nullable=False, default=0)
+
+
+class ScheduledReply(Base):
+    """
+    Auto-reply comment, waiting to be generated and published at due time.
+
+    Rows are kept in database, so pending replies survive application restart. Worker claims row for generation
+    with `claimed_at`, so with several workers every reply is generated once.
+    """
+
+    __tablename__ = "scheduled_replies"
+
+    id = Column(Integer, primary_key=True)
+    comment_id = Column(Integer, ForeignKey("comments.id"))  # Comment to reply to
+    content = Column(Text)  # Generated reply content, empty until generation is done
+    due_at = Column(DateTime, nullable=False, index=True)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    claimed_at = Column(DateTime, nullable=True)  # Start of generation by some worker, empty if not generating
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # Failed generation attempts
+    failed_at = Column(DateTime, nullable=True)  # Set when generation failed too many times and was given up
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Text, Float
+
+from ..database import Base
+
+
+class ModerationCacheEntry(Base):
+    """Cached moderation result for content, shared between application workers"""
+    __tablename__ = "moderation_cache"
+
+    content_hash = Column(String(64), primary_key=True)
+    result = Column(Text, nullable=False)  # Moderation result, serialized as JSON
+    expires_at = Column(Float, nullable=False)  # Unix timestamp
+    last_used_at = Column(Float, nullable=False, index=True)  # Unix timestamp, for least recently used eviction
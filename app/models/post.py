@@ -12,6 +12,8 @@ class Post(Base):
     title = Column(String, index=True)
     content = Column(Text)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Bumped on every change of post or its comments, used as entity tag
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
     owner = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post")
@@ -0,0 +1,56 @@
+from sqlalchemy import Connection, event, text
+
+from ..database import Base
+
+# Full-text indexes of posts and comments. FTS5 tables are external content ones: they keep only the index and read
+# text from posts and comments tables, and triggers keep them in sync. Same statements are applied by migration.
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts "
+    "USING fts5(title, content, content='posts', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts "
+    "USING fts5(content, content='comments', content_rowid='id', tokenize='porter unicode61')",
+
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content ON posts BEGIN "
+    "INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN "
+    "INSERT INTO comments_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN "
+    "INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF content ON comments BEGIN "
+    "INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO comments_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+SEARCH_INDEX_REBUILD = [
+    "INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')",
+    "INSERT INTO comments_fts(comments_fts) VALUES ('rebuild')",
+]
+
+SEARCH_INDEX_DROP = [
+    "DROP TABLE IF EXISTS posts_fts",
+    "DROP TABLE IF EXISTS comments_fts",
+]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection: Connection, **kw) -> None:
+    """Create full-text indexes along with tables, building them from existing rows if they are new"""
+    is_new = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'")).first() is None
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+    if is_new:
+        for statement in SEARCH_INDEX_REBUILD:
+            connection.execute(text(statement))
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_search_index(target, connection: Connection, **kw) -> None:
+    """Drop full-text indexes along with tables they index"""
+    for statement in SEARCH_INDEX_DROP:
+        connection.execute(text(statement))
@@ -2,3 +2,5 @@ from .auth import router as auth_router
 from .post import router as post_router
 from .user import router as user_router
 from .comment import router as comment_router
+from .search import router as search_router
+from .metrics import router as metrics_router
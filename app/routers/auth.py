@@ -8,10 +8,12 @@ from ..schemas.user import UserCreate, UserUpdate, User as UserSchema
 from ..schemas.user import UserProfile as UserProfileSchema
 from ..models import User as UserModel
 from ..models import UserProfile as UserProfileModel
-from ..database import get_db
-from ..core.security import get_password_hash, verify_password, create_access_token, get_current_user
+from ..database import get_async_db
+from ..core.security import hash_password, verify_and_update_password, create_access_token, get_current_user
+from ..core.security import CurrentUser, invalidate_cached_user
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -25,7 +27,7 @@ router = APIRouter()
              response_description="Registered user object")
 async def create_user(
         user: UserCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ) -> UserModel:
     """
     Endpoint for creating users
@@ -36,34 +38,34 @@ async def create_user(
 
     try:
         # Check, if user already exists
-        db_user = db.query(UserModel).filter(UserModel.username == user.username).first()
+        db_user = await db.scalar(select(UserModel).filter(UserModel.username == user.username))
         if db_user:
             raise HTTPException(status_code=400,
                                 detail="Username already registered")
 
         # Check, if email already exists
-        db_user = db.query(UserModel).filter(UserModel.email == user.email).first()
+        db_user = await db.scalar(select(UserModel).filter(UserModel.email == user.email))
         if db_user:
             raise HTTPException(status_code=400,
                                 detail="Email already registered")
 
         # Add user to database with hashed password
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await hash_password(user.password)
         db_user = UserModel(username=user.username, email=user.email, hashed_password=hashed_password)
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
 
         # Create user profile
         user_profile = UserProfileModel(user_id=db_user.id)
         db.add(user_profile)
-        db.commit()
-        db.refresh(user_profile)
+        await db.commit()
+        await db.refresh(user_profile)
 
         return db_user
 
     except SQLAlchemyError as e:  # Handle database error
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500,
                             detail=f"An database error occurred while trying to register: {e}")
 
@@ -71,7 +73,7 @@ async def create_user(
 @router.post("/login", response_model=dict)
 async def login_for_access_token(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ) -> dict:
     """
     Login user by getting JWT token
@@ -80,18 +82,27 @@ async def login_for_access_token(
     :return: Dict with access token
     """
     try:
-        user = db.query(UserModel).filter(UserModel.username == form_data.username).first()
-        if not user or not verify_password(form_data.password, user.hashed_password):
+        user = await db.scalar(select(UserModel).filter(UserModel.username == form_data.username))
+        is_valid, new_hashed_password = False, None
+        if user:
+            is_valid, new_hashed_password = await verify_and_update_password(form_data.password, user.hashed_password)
+        if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
                 headers={"WWW-Authenticate": "Bearer"}
             )
+
+        # Rehash password, if bcrypt cost was changed since it was hashed
+        if new_hashed_password:
+            user.hashed_password = new_hashed_password
+            await db.commit()
+
         access_token_expires = timedelta(minutes=30)
         access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
         return {"access_token": access_token, "token_type": "bearer"}
     except SQLAlchemyError as e:  # Handle database error
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500,
                             detail=f"An database error occurred while trying to login: {e}")
 
@@ -99,8 +110,8 @@ async def login_for_access_token(
 @router.patch("/user", response_model=UserSchema)
 async def update_profile(
         user_update: UserUpdate,
-        db: Session = Depends(get_db),
-        current_user: UserModel = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user),
 ) -> UserModel:
     """
     Endpoint for partial updating user data
@@ -109,22 +120,25 @@ async def update_profile(
     :param user_update: UserUpdate model
     :return: Updated user model
     """
-    user = db.query(UserModel).filter(UserModel.id == current_user.id).first()
+    user = await db.scalar(select(UserModel).filter(UserModel.id == current_user.id))
 
     for var, value in vars(user_update).items():
         setattr(user, var, value) if value else None
 
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+
+    # Token of old username must not authenticate renamed user from cache
+    invalidate_cached_user(current_user.username)
 
     return user
 
 
 @router.delete("/user", response_model=dict)
 async def delete_profile(
-        db: Session = Depends(get_db),
-        current_user: UserModel = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
 ) -> dict:
     """
     Delete current user and profile
@@ -135,27 +149,29 @@ async def delete_profile(
     try:
         # Get user profile
         user_id = current_user.id
-        db_user_profile = db.query(UserProfileModel).filter(UserProfileModel.user_id == user_id).first()
+        db_user_profile = await db.scalar(select(UserProfileModel).filter(UserProfileModel.user_id == user_id))
         if db_user_profile is None:
             raise HTTPException(status_code=404,
                                 detail="Current user profile not found")
 
         # Delete user and profile
-        db.delete(current_user)
-        db.delete(db_user_profile)
-        db.commit()
+        db_user = await db.get(UserModel, user_id)
+        await db.delete(db_user)
+        await db.delete(db_user_profile)
+        await db.commit()
+        invalidate_cached_user(current_user.username)
 
         return {"message": f"User {current_user.username} was deleted successfully"}
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500,
                             detail=f"An database error occurred while deleting the user profile: {e}")
 
 
 @router.get("/my-profile", response_model=UserProfileSchema)
 async def get_current_user_profile(
-        db: Session = Depends(get_db),
-        current_user: UserModel = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
 ) -> UserProfileModel:
     """
     Get current authenticated user profile
@@ -164,7 +180,7 @@ async def get_current_user_profile(
     :return: Dict with user profile info
     """
     try:
-        user_profile = db.query(UserProfileModel).filter(UserProfileModel.user_id == current_user.id).first()
+        user_profile = await db.scalar(select(UserProfileModel).filter(UserProfileModel.user_id == current_user.id))
         if user_profile is None:
             raise HTTPException(status_code=404,
                                 detail="Current user profile not found")
@@ -178,8 +194,8 @@ async def get_current_user_profile(
 
 @router.get("/refresh-access-token", response_model=dict)
 async def refresh_access_token(
-        db: Session = Depends(get_db),
-        current_user: UserModel = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
 ) -> dict:
     """
     Refresh access token endpoint for current user.
@@ -188,12 +204,12 @@ async def refresh_access_token(
     :return: Dict with new access token
     """
     try:
-        user = db.query(UserModel).filter(UserModel.id == current_user.id).first()
+        user = await db.scalar(select(UserModel).filter(UserModel.id == current_user.id))
         access_token_expires = timedelta(minutes=30)
         access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
         return {"access_token": access_token, "token_type": "bearer"}
 
     except SQLAlchemyError as e:  # Handle database error
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500,
                             detail=f"An database error occurred while trying to refresh token: {e}")
@@ -1,114 +1,216 @@
+import json
 from datetime import datetime, date, timedelta
-from typing import Type
+from typing import AsyncIterator, Iterator, Literal, Type
 
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..schemas.comment import CommentCreate, CommentUpdate, Comment as CommentSchema
 from ..schemas.comment import BlockedComment as BlockedCommentSchema
+from ..schemas.comment import CommentPage as CommentPageSchema
+from ..schemas.comment import CommentBatchCreate, CommentBatchResult as CommentBatchResultSchema
 from ..models.comment import Comment as CommentModel
 from ..models.comment import BlockedComment as BlockedCommentModel
+from ..models.comment import CommentDailyStats
 from ..models.post import Post as PostModel
 from ..models.user import User as UserModel
-from ..database import get_db
-from ..core.security import get_current_user
+from ..database import get_async_db, get_async_sessionmaker
+from ..core.config import settings
+from ..core.etag import is_not_modified, weak_etag
+from ..core.pagination import encode_cursor, decode_cursor
+from ..core.security import CurrentUser, get_current_user
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Select, insert, select, tuple_, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from ..services.llm_moderation import moderation_service
-from ..services.auto_reply_to_comment import auto_reply_to_comment_service
+from ..services.post_versions import post_versions
+from ..services.reply_scheduler import reply_scheduler
+from ..services.comment_daily_stats import update_comment_daily_stats
 
 router = APIRouter()
 
 
-@router.get("/posts/{post_id}/comments", response_model=list[CommentSchema])
+def _encode_comment_cursor(comment: CommentModel) -> str:
+    """Encode position of comment in listing ordered by creation time"""
+    return encode_cursor({"created_at": comment.created_at.isoformat(), "id": comment.id})
+
+
+def _decode_comment_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode cursor, created by `_encode_comment_cursor`, into (created_at, id) tuple"""
+    values = decode_cursor(cursor, "created_at", "id")
+    try:
+        return datetime.fromisoformat(values["created_at"]), int(values["id"])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/posts/{post_id}/comments", response_model=CommentPageSchema)
 async def list_comments(
         post_id: int,
-        db: Session = Depends(get_db)
-):
+        request: Request,
+        limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE,
+                           description="Maximum amount of comments in page"),
+        after: str | None = Query(None, description="Cursor from next_cursor, to get comments after it"),
+        before: str | None = Query(None, description="Cursor from prev_cursor, to get comments before it"),
+        db: AsyncSession = Depends(get_async_db)
+) -> dict | Response:
     """
-    Endpoint for retrieving comments for specific post
+    Endpoint for retrieving comments for specific post page by page, ordered by creation time.
+
+    Response has weak ETag of post version. Request with matching If-None-Match is answered with 304.
+    Serialized pages are cached by post version, so hot posts are served without database.
     :param post_id: Post id to retrieve comments for
+    :param request: Current request
+    :param limit: Page size
+    :param after: Opaque cursor, pointing to the last comment of previous page
+    :param before: Opaque cursor, pointing to the first comment of next page
     :param db: Current database Session object
-    :return: Retrieved comments list
+    :return: Dict with comments page and cursors for the next and previous pages
     """
+    if after is not None and before is not None:
+        raise HTTPException(status_code=400, detail="Only one of 'after' and 'before' cursors can be provided")
+
     try:
-        db_comments = db.query(CommentModel).filter(CommentModel.post_id == post_id).all()
-        return db_comments
+        # Post version is usually cached, so poller with up-to-date page doesn't cost a query
+        version = await post_versions.get(db, post_id)
+        if version is None:
+            # Post doesn't exist, so there is no version to tag or cache page by
+            return await _comments_page(db, post_id, limit, after, before)
+
+        etag = weak_etag("comments", post_id, version)
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        cache_key = ("comments", post_id, version, limit, after, before)
+        body = post_versions.responses.get(cache_key)
+        if body is None:
+            page = await _comments_page(db, post_id, limit, after, before)
+            body = CommentPageSchema.model_validate(page, from_attributes=True).model_dump_json().encode()
+            post_versions.responses.set(cache_key, body, group=post_id)
+
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500,
                             detail=f"An error occurred while trying to retrieve list of comments for {post_id}: {e}")
 
 
+async def _comments_page(db: AsyncSession, post_id: int, limit: int, after: str | None, before: str | None) -> dict:
+    """Query page of post comments in direction of given cursor"""
+    # Ordering matches ix_comments_post_id_created_at_id index, so page is read straight from it
+    sort_key = tuple_(CommentModel.created_at, CommentModel.id)
+    query = select(CommentModel).filter(CommentModel.post_id == post_id)
+
+    if before is not None:
+        cursor = _decode_comment_cursor(before)
+        query = query.filter(sort_key < cursor).order_by(CommentModel.created_at.desc(), CommentModel.id.desc())
+    else:
+        if after is not None:
+            query = query.filter(sort_key > _decode_comment_cursor(after))
+        query = query.order_by(CommentModel.created_at, CommentModel.id)
+
+    # Fetch one extra row to find out, if there are more comments in requested direction
+    db_comments = (await db.scalars(query.limit(limit + 1))).all()
+    has_more = len(db_comments) > limit
+    db_comments = db_comments[:limit]
+
+    if before is not None:
+        db_comments = db_comments[::-1]
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after is not None
+
+    return {
+        "items": db_comments,
+        "next_cursor": _encode_comment_cursor(db_comments[-1]) if has_next and db_comments else None,
+        "prev_cursor": _encode_comment_cursor(db_comments[0]) if has_prev and db_comments else None,
+    }
+
+
+def _blocking_reasoning(moderation_result: dict) -> str:
+    """Extract blocking reasoning from moderation service response"""
+    categories = moderation_result.get("categories")
+    return ' '.join([reason for reason in categories.keys() if categories.get(reason)])
+
+
+async def _get_post_reply_settings(db: AsyncSession, post_id: int) -> tuple[int, bool, int]:
+    """
+    Get post author and auto-reply settings at once
+    :raises HTTPException: 404, if post doesn't exist
+    :return: Tuple of post author id, whether auto-reply is enabled and auto-reply delay in minutes
+    """
+    post_row = (await db.execute(
+        select(PostModel.owner_id, UserModel.auto_respond_to_comments, UserModel.auto_respond_time)
+        .outerjoin(UserModel, UserModel.id == PostModel.owner_id)
+        .filter(PostModel.id == post_id)
+    )).one_or_none()
+    if post_row is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return tuple(post_row)
+
+
 @router.post("/posts/{post_id}/comments", response_model=CommentSchema | BlockedCommentSchema, status_code=201)
 async def create_comment(
         comment: CommentCreate,
         post_id: int,
-        background_tasks: BackgroundTasks,
-        db: Session = Depends(get_db),
-        current_user: UserModel = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Endpoint for creating comment to specific post.
 
-    After adding comment to database, calls auto-reply service, if author enabled this feature
-    and if comment author is not author of the post.
+    Comment is saved after moderation. If author of the post enabled auto-reply feature and comment author is not
+    author of the post, reply is scheduled in the same transaction.
     :param comment: Create comment model
     :param post_id: Post id to create comment for
-    :param background_tasks: FastAPI BackgroundTasks object for putting delayed comment auto reply in background
     :param db: Current database Session object
     :param current_user: Comment author
     :return: Created comment
     """
     try:
-        db_comment = CommentModel(**comment.dict(), post_id=post_id, owner_id=current_user.id)
+        # Fail on missing post before paying for moderation call
+        post_author_id, auto_reply_enabled, auto_reply_delay = await _get_post_reply_settings(db, post_id)
+
+        # Release connection, so it isn't held while waiting for moderation API
+        await db.rollback()
 
         # Call moderation service to check for potential harmfulness of content and check moderation result
         moderation_result = await moderation_service.moderate_content(comment.content)
 
         if moderation_result.get("flagged"):
-            # Extract blocking reasoning from moderation service response
-            blocking_reasoning_string = ' '.join(
-                [reason for reason in moderation_result.get("categories").keys() if
-                 moderation_result.get("categories").get(reason)])
-
             # Add blocked comment to table in database of blocked comments
             blocked_db_comment = BlockedCommentModel(**comment.dict(),
                                                      post_id=post_id,
                                                      owner_id=current_user.id,
-                                                     blocking_reasoning=blocking_reasoning_string)
+                                                     blocking_reasoning=_blocking_reasoning(moderation_result))
             blocked_db_comment.created_at = datetime.now()
             db.add(blocked_db_comment)
-            db.commit()
+            await update_comment_daily_stats(db, post_id, blocked_db_comment.created_at, blocked_delta=1)
+            await db.commit()
 
             raise HTTPException(status_code=422, detail="Content is flagged by moderation")
 
-        db_comment.created_at = datetime.now()
+        db_comment = CommentModel(**comment.dict(), post_id=post_id, owner_id=current_user.id,
+                                  created_at=datetime.now())
         db.add(db_comment)
-        db.commit()
-        db.refresh(db_comment)
-
-        # Check, if post author enabled auto-reply feature, and if so, call corresponding service
+        await update_comment_daily_stats(db, post_id, db_comment.created_at, comments_delta=1)
+        await post_versions.bump(db, post_id)
 
-        # Get post author and check auto-reply flag
-        db_post = db.query(PostModel).filter(PostModel.id == post_id).first()
-        post_author_id = db_post.owner_id
-        db_post_owner = db.query(UserModel).filter(UserModel.id == post_author_id).first()
-        auto_reply_enabled = db_post_owner.auto_respond_to_comments
-
-        # Also ensure, that comment wasn't written by post author
+        # Reply is generated and published in background, so it doesn't add to this request latency
+        scheduled_reply = None
         if auto_reply_enabled and post_author_id != current_user.id:
-            reply_comment_str = await auto_reply_to_comment_service.get_reply_string(
-                post_content=db_post.content,
-                comment_to_reply_content=db_comment
-            )
+            await db.flush()
+            scheduled_reply = reply_scheduler.schedule(db,
+                                                       comment_id=db_comment.id,
+                                                       delay_min=auto_reply_delay,
+                                                       author_id=post_author_id,
+                                                       post_id=post_id)
 
-            background_tasks.add_task(func=auto_reply_to_comment_service.reply_with_delay,
-                                      delay_min=db_post_owner.auto_respond_time,
-                                      reply_comment_str=reply_comment_str,
-                                      author_id=post_author_id,
-                                      post_id=db_post.id,
-                                      db=db)
+        await db.commit()
+
+        if scheduled_reply is not None:
+            reply_scheduler.enqueue(scheduled_reply)
 
         return db_comment
     except SQLAlchemyError as e:
@@ -116,13 +218,92 @@ async def create_comment(
                             detail=f"An error occurred while trying to create comment for {post_id}: {e}")
 
 
+@router.post("/posts/{post_id}/comments:batch", response_model=CommentBatchResultSchema, status_code=201)
+async def create_comments_batch(
+        batch: CommentBatchCreate,
+        post_id: int,
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
+) -> dict:
+    """
+    Endpoint for creating several comments to specific post at once, e.g. by importers.
+
+    All comments are moderated with batched moderation calls. Accepted comments and blocked ones are inserted with one
+    statement each, in one transaction together with stats and auto-replies, so either all of them are saved or none.
+    :param batch: Comments to create, up to COMMENT_BATCH_MAX_SIZE
+    :param post_id: Post id to create comments for
+    :param db: Current database Session object
+    :param current_user: Comments author
+    :return: Per-item result, in the same order as comments in request, with amounts of created and blocked comments
+    """
+    if len(batch.comments) > settings.COMMENT_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=422,
+                            detail=f"At most {settings.COMMENT_BATCH_MAX_SIZE} comments can be created at once")
+
+    try:
+        # Fail on missing post before paying for moderation call
+        post_author_id, auto_reply_enabled, auto_reply_delay = await _get_post_reply_settings(db, post_id)
+
+        # Release connection, so it isn't held while waiting for moderation API
+        await db.rollback()
+
+        contents = [comment.content for comment in batch.comments]
+        moderation_results = await moderation_service.moderate_contents(contents)
+
+        created_at = datetime.now()
+        accepted, blocked = [], []
+        for index, (content, moderation_result) in enumerate(zip(contents, moderation_results)):
+            row = {"content": content, "created_at": created_at, "owner_id": current_user.id, "post_id": post_id}
+            if moderation_result.get("flagged"):
+                blocked.append((index, {**row, "blocking_reasoning": _blocking_reasoning(moderation_result)}))
+            else:
+                accepted.append((index, row))
+
+        items = []
+        for rows, model, schema, status in ((accepted, CommentModel, CommentSchema, "created"),
+                                            (blocked, BlockedCommentModel, BlockedCommentSchema, "blocked")):
+            if not rows:
+                continue
+            # Ids are returned in order of rows
+            ids = (await db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True),
+                                    [row for _, row in rows])).all()
+            items += [{"index": index, "status": status, "comment": schema(id=id_, **row)}
+                      for (index, row), id_ in zip(rows, ids)]
+
+        await update_comment_daily_stats(db, post_id, created_at,
+                                         comments_delta=len(accepted), blocked_delta=len(blocked))
+        if accepted:
+            await post_versions.bump(db, post_id)
+
+        scheduled_replies = []
+        if auto_reply_enabled and post_author_id != current_user.id:
+            scheduled_replies = [reply_scheduler.schedule(db,
+                                                          comment_id=item["comment"].id,
+                                                          delay_min=auto_reply_delay,
+                                                          author_id=post_author_id,
+                                                          post_id=post_id)
+                                 for item in items if item["status"] == "created"]
+
+        await db.commit()
+
+        for scheduled_reply in scheduled_replies:
+            reply_scheduler.enqueue(scheduled_reply)
+
+        return {"items": sorted(items, key=lambda item: item["index"]),
+                "created": len(accepted),
+                "blocked": len(blocked)}
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500,
+                            detail=f"An error occurred while trying to create comments for {post_id}: {e}")
+
+
 @router.put("/posts/{post_id}/comments/{comment_id}", response_model=CommentSchema)
 async def update_comment(
         post_id: int,
         comment_id: int,
         comment: CommentUpdate,
-        db: Session = Depends(get_db),
-        current_user: UserModel = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Endpoint for updating comment by its author
@@ -134,7 +315,7 @@ async def update_comment(
     :return: Updated comment
     """
     try:
-        db_comment = db.query(CommentModel).filter(CommentModel.id == comment_id).first()
+        db_comment = await db.scalar(select(CommentModel).filter(CommentModel.id == comment_id))
 
         if db_comment is None:
             raise HTTPException(status_code=404,
@@ -145,18 +326,21 @@ async def update_comment(
             raise HTTPException(status_code=403,
                                 detail="Comment can be updated only by its author.")
 
-        # Call moderation service to check for potential harmfulness of content and check moderation result
-        moderation_result = await moderation_service.moderate_content(comment.content)
+        # Call moderation service to check for potential harmfulness of content and check moderation result.
+        # Unchanged content has already passed moderation
+        if comment.content != db_comment.content:
+            moderation_result = await moderation_service.moderate_content(comment.content)
 
-        if moderation_result.get("flagged"):
-            raise HTTPException(status_code=422, detail="Content is flagged by moderation")
+            if moderation_result.get("flagged"):
+                raise HTTPException(status_code=422, detail="Content is flagged by moderation")
 
         for var, value in vars(comment).items():
             setattr(db_comment, var, value) if value else None
 
         db.add(db_comment)
-        db.commit()
-        db.refresh(db_comment)
+        await post_versions.bump(db, db_comment.post_id)
+        await db.commit()
+        await db.refresh(db_comment)
 
         return db_comment
 
@@ -169,8 +353,8 @@ async def update_comment(
 async def delete_comment(
         post_id: int,
         comment_id: int,
-        db: Session = Depends(get_db),
-        current_user: UserModel = Depends(get_current_user)) -> dict:
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)) -> dict:
     """
     Endpoint for deleting comment by its author
     :param post_id: Post id to delete comment for
@@ -180,8 +364,8 @@ async def delete_comment(
     """
 
     try:
-        db_comment = db.query(CommentModel).filter(CommentModel.post_id == post_id,
-                                                   CommentModel.id == comment_id).first()
+        db_comment = await db.scalar(select(CommentModel).filter(CommentModel.post_id == post_id,
+                                                                 CommentModel.id == comment_id))
 
         if db_comment is None:
             raise HTTPException(status_code=404, detail="Comment not found")
@@ -191,8 +375,10 @@ async def delete_comment(
             raise HTTPException(status_code=403,
                                 detail="Comment can be deleted only by its author.")
 
-        db.delete(db_comment)
-        db.commit()
+        await db.delete(db_comment)
+        await update_comment_daily_stats(db, db_comment.post_id, db_comment.created_at, comments_delta=-1)
+        await post_versions.bump(db, db_comment.post_id)
+        await db.commit()
 
         return {"detail": "Comment deleted successfully."}
     except SQLAlchemyError as e:
@@ -200,100 +386,199 @@ async def delete_comment(
                             detail=f"An error occurred while trying to delete comment: {e}")
 
 
-@router.get("/comments-daily-breakdown")
-def get_comments_daily_breakdown(
-        date_from: str = Query(..., description="Start date for comment analytic"),
-        date_to: str = Query(..., description="End date for comment analytic"),
-        db: Session = Depends(get_db)
-) -> dict:
+async def _daily_counts(db: AsyncSession, date_from: date, date_to: date) -> tuple[dict, dict]:
+    """
+    Get amount of comments and blocked comments for each day from comment_daily_stats rollup.
+    :param db: Current database Session object
+    :param date_from: Start date, included
+    :param date_to: End date, included
+    :return: Dicts with comments amount for each day with comments, and with blocked comments amount
+    """
+    counts = await db.execute(
+        select(CommentDailyStats.date,
+               func.sum(CommentDailyStats.comment_count),
+               func.sum(CommentDailyStats.blocked_count))
+        .filter(CommentDailyStats.date >= date_from, CommentDailyStats.date <= date_to)
+        .group_by(CommentDailyStats.date)
+        .order_by(CommentDailyStats.date)
+    )
+
+    comments, blocked_comments = {}, {}
+    for day, comments_amount, blocked_comments_amount in counts:
+        if comments_amount:
+            comments[str(day)] = {"comments_amount": comments_amount}
+        if blocked_comments_amount:
+            blocked_comments[str(day)] = {"comments_amount": blocked_comments_amount}
+
+    return comments, blocked_comments
+
+
+def _daily_items_query(
+        model: Type[CommentModel] | Type[BlockedCommentModel],
+        date_from: date,
+        date_to: date,
+        items_per_day: int) -> Select:
+    """
+    Build query for first comments of each day in range, ordered by creation time.
+    :param model: Comment model to get items from. One of CommentModel, BlockedCommentModel
+    :param date_from: Start date, included
+    :param date_to: End date, included
+    :param items_per_day: Maximum amount of comments for each day
+    :return: Select statement, returning "day" column along with comment columns
+    """
+    day = func.date(model.created_at)
+    columns = model.__table__.columns
+
+    # Number comments within each day and keep only first ones of each day
+    numbered = select(
+        *columns,
+        day.label("day"),
+        func.row_number().over(partition_by=day, order_by=(model.created_at, model.id)).label("row_number")
+    ).filter(
+        model.created_at >= datetime.combine(date_from, datetime.min.time()),
+        # Add 1 day to date_to, so it will also be included
+        model.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+    ).subquery()
+
+    return (
+        select(numbered.c.day, *[numbered.c[column.name] for column in columns])
+        .filter(numbered.c.row_number <= items_per_day)
+        .order_by(numbered.c.created_at, numbered.c.id)
+    )
+
+
+async def _attach_daily_items(
+        db: AsyncSession,
+        breakdown: dict,
+        model: Type[CommentModel] | Type[BlockedCommentModel],
+        date_from: date,
+        date_to: date,
+        items_per_day: int) -> None:
+    """
+    Attach first comments of each day to breakdown, built by `_daily_counts`.
+    :param db: Current database Session object
+    :param breakdown: Dict with comments amount for each day, to add items to
+    :param model: Comment model to get items from. One of CommentModel, BlockedCommentModel
+    :param date_from: Start date, included
+    :param date_to: End date, included
+    :param items_per_day: Maximum amount of comments attached for each day
+    """
+    for day_str in breakdown:
+        breakdown[day_str]["items"] = []
+
+    items = await db.execute(_daily_items_query(model, date_from, date_to, items_per_day))
+    for row in items.mappings():
+        item = dict(row)
+        breakdown.setdefault(item.pop("day"), {"comments_amount": 0, "items": []})["items"].append(item)
+
+
+def _ndjson_line(data: dict) -> bytes:
+    """Serialize dict as single NDJSON line"""
+    return (json.dumps(data, default=lambda value: value.isoformat()) + "\n").encode()
+
+
+async def _stream_daily_breakdown(
+        session_factory: async_sessionmaker,
+        comments: dict,
+        blocked_comments: dict,
+        date_from: date,
+        date_to: date,
+        include_items: bool,
+        items_per_day: int) -> AsyncIterator[bytes]:
+    """
+    Stream comments daily breakdown as NDJSON.
+
+    Each day bucket is a {"type": "day", ...} line, followed by {"type": "comment", ...} line for each of its comments,
+    if items are included. Last line is {"type": "total", ...} with total amounts.
+    Items are read with server-side cursor in batches, so memory usage doesn't depend on the range size.
+    :param session_factory: Factory for session, that lives as long as the stream
+    :param comments: Comments amount for each day, built by `_daily_counts`
+    :param blocked_comments: Blocked comments amount for each day, built by `_daily_counts`
+    :param date_from: Start date, included
+    :param date_to: End date, included
+    :param include_items: Whether to stream comments, or only their amount for each day
+    :param items_per_day: Maximum amount of comments streamed for each day
+    """
+    for comments_type, model, breakdown in (("comments", CommentModel, comments),
+                                            ("blocked_comments", BlockedCommentModel, blocked_comments)):
+        days = iter(breakdown.items())
+
+        def day_lines(until: str | None = None) -> Iterator[bytes]:
+            """Lines for day buckets up to given day included, or for all remaining ones"""
+            for day_str, day_counts in days:
+                yield _ndjson_line({"type": "day", "comments_type": comments_type, "date": day_str, **day_counts})
+                if day_str == until:
+                    return
+
+        if include_items:
+            async with session_factory() as db:
+                items = await db.stream(_daily_items_query(model, date_from, date_to, items_per_day)
+                                        .execution_options(yield_per=settings.STREAM_BATCH_SIZE))
+                current_day = None
+                async for row in items.mappings():
+                    item = dict(row)
+                    item_day = item.pop("day")
+                    if item_day != current_day:
+                        for line in day_lines(until=item_day):
+                            yield line
+                        current_day = item_day
+                    yield _ndjson_line({"type": "comment", "comments_type": comments_type, **item})
+
+        for line in day_lines():
+            yield line
+
+    yield _ndjson_line({
+        "type": "total",
+        "total_comments_amount": sum(day["comments_amount"] for day in comments.values()),
+        "total_blocked_comments_amount": sum(day["comments_amount"] for day in blocked_comments.values())
+    })
+
+
+@router.get("/comments-daily-breakdown", response_model=dict)
+async def get_comments_daily_breakdown(
+        date_from: date = Query(..., description="Start date for comment analytic"),
+        date_to: date = Query(..., description="End date for comment analytic"),
+        include_items: bool = Query(True, description="Include comments themselves, not only their amount"),
+        items_per_day: int = Query(100, ge=1, le=settings.BREAKDOWN_MAX_ITEMS_PER_DAY,
+                                   description="Maximum amount of comments included for each day"),
+        response_format: Literal["json", "ndjson"] = Query("json", alias="format",
+                                                           description="Response format. ndjson streams the result"),
+        db: AsyncSession = Depends(get_async_db),
+        session_factory: async_sessionmaker = Depends(get_async_sessionmaker)
+) -> dict | StreamingResponse:
     """
     Get analytics for comment between specified dates.
+
+    Amounts are read from comment_daily_stats rollup, so they cost O(days) regardless of amount of comments.
     :param date_from: Start date, included
     :param date_to: End date, included
+    :param include_items: Whether to include comments for each day, or only their amount
+    :param items_per_day: Maximum amount of comments included for each day
+    :param response_format: "json" for single JSON object, "ndjson" for streamed line per day and per comment
     :param db: Current database Session object
+    :param session_factory: Session factory for streamed response, as request session is closed before streaming
     :return: Retrieved comments analytics
     """
-    # Get comments from database
-    db_comments = db.query(CommentModel).filter(
-        CommentModel.created_at >= datetime.strptime(date_from, '%Y-%m-%d'),
-        # Add 1 day to date_to, so it will also be included
-        CommentModel.created_at < (datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
-    ).all()
-
-    # Get blocked comments from database
-    db_blocked_comments = db.query(BlockedCommentModel).filter(
-        CommentModel.created_at >= datetime.strptime(date_from, '%Y-%m-%d'),
-        CommentModel.created_at <= (datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
-    ).all()
-
-    response_dict = {
-        "comments": {},
-        "blocked_comments": {}
-    }
-    total_comments_amount = 0
-    total_blocked_comments_amount = 0
-
-    def dict_with_formatted_comments_info(
-            _response_dict: dict,
-            comments: list[Type[CommentModel]],
-            comments_type: str,
-            total_amount: int) -> tuple[dict, int]:
-        """
-        Parse given list of comment model from database.
-        :param _response_dict: Dict that will be returned by the endpoint
-        :param comments: Retrieved comments from the database
-        :param comments_type: Type of comments that will be processed. One of "comments", "blocked_comments"
-        :param total_amount: Total amount of comments value
-        :return:
-        """
-        for comment in comments:
-            # Group comments by days
-            comment_date = comment.created_at.date()
-
-            if str(comment_date) not in _response_dict.get(
-                    comments_type).keys():  # Initiate list with comments for that date
-                _response_dict[comments_type].update({str(comment_date): {"items": [comment.to_dict()]}})
-            else:
-                _response_dict[comments_type][str(comment_date)]["items"].append(comment.to_dict())
-
-            # Add count for total comments amount
-            total_amount += 1
-
-        # Temp dict for counting comments amount for each day
-        date_comments_amount_temp = {}
-
-        # Update dict with amount of comments for each day
-        for date_str in _response_dict[comments_type].keys():
-            date_comments_amount_temp.update({
-                date_str: {
-                    "comments_amount": len(_response_dict[comments_type][date_str]["items"])
-                }
-            })
-
-        # Merge dicts with items and amount of comments together
-        resulting_dict = {k: dict(_response_dict[comments_type].get(k, {}),
-                                  **date_comments_amount_temp.get(k, {}))
-                          for k in set(_response_dict[comments_type]) | set(date_comments_amount_temp)}
-
-        return resulting_dict, total_amount
-
-    # Update resulting response dict with parsed comments according to their existence
-    if db_comments:
-        parsed_comments_dict, total_comments_amount = dict_with_formatted_comments_info(
-            response_dict, db_comments, "comments", total_comments_amount
-        )
-        response_dict["comments"].update(parsed_comments_dict)
-
-    if db_blocked_comments:
-        parsed_blocked_comments_dict, total_blocked_comments_amount = dict_with_formatted_comments_info(
-            response_dict, db_blocked_comments, "blocked_comments", total_blocked_comments_amount
-        )
-        response_dict["blocked_comments"].update(parsed_blocked_comments_dict)
-
-    # Update dict with total amount of comments
-    response_dict.update({
-        "total_comments_amount": total_comments_amount,
-        "total_blocked_comments_amount": total_blocked_comments_amount
-    })
+    try:
+        comments, blocked_comments = await _daily_counts(db, date_from, date_to)
+
+        if response_format == "ndjson":
+            return StreamingResponse(
+                _stream_daily_breakdown(session_factory, comments, blocked_comments,
+                                        date_from, date_to, include_items, items_per_day),
+                media_type="application/x-ndjson"
+            )
 
-    return response_dict
+        if include_items:
+            await _attach_daily_items(db, comments, CommentModel, date_from, date_to, items_per_day)
+            await _attach_daily_items(db, blocked_comments, BlockedCommentModel, date_from, date_to, items_per_day)
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500,
+                            detail=f"An error occurred while trying to get comments daily breakdown: {e}")
+
+    return {
+        "comments": comments,
+        "blocked_comments": blocked_comments,
+        "total_comments_amount": sum(day["comments_amount"] for day in comments.values()),
+        "total_blocked_comments_amount": sum(day["comments_amount"] for day in blocked_comments.values())
+    }
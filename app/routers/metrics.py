@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request, Response
+from prometheus_client.exposition import choose_encoder
+
+from ..core.metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request) -> Response:
+    """
+    Endpoint for scraping application metrics by Prometheus
+    :param request: Current request. Its Accept header selects Prometheus text or OpenMetrics format
+    :return: Metrics in requested exposition format
+    """
+    encoder, content_type = choose_encoder(request.headers.get("accept", ""))
+    return Response(content=encoder(REGISTRY), media_type=content_type)
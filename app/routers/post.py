@@ -1,31 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.exc import SQLAlchemyError
 
-from ..schemas.post import PostCreate, PostUpdate, Post as PostSchema
+from ..schemas.post import PostCreate, PostUpdate, Post as PostSchema, PostPage as PostPageSchema
 from ..models.post import Post as PostModel
-from ..models.user import User
-from ..database import get_db
-from ..core.security import get_current_user
+from ..database import get_async_db
+from ..core.config import settings
+from ..core.etag import is_not_modified, weak_etag
+from ..core.pagination import encode_cursor, decode_cursor
+from ..core.security import CurrentUser, get_current_user
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..services.llm_moderation import moderation_service
+from ..services.post_versions import post_versions
 
 router = APIRouter()
 
 
-@router.get("/posts", response_model=list[PostSchema])
+def _decode_post_cursor(cursor: str) -> int:
+    """Decode cursor of posts listing into id of the last post of previous page"""
+    values = decode_cursor(cursor, "id")
+    try:
+        return int(values["id"])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/posts", response_model=PostPageSchema)
 async def list_posts(
-        db: Session = Depends(get_db)
-) -> list:
+        limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE,
+                           description="Maximum amount of posts in page"),
+        cursor: str | None = Query(None, description="Cursor from next_cursor of previous page"),
+        db: AsyncSession = Depends(get_async_db)
+) -> dict:
     """
-    Endpoint for retrieving all posts
+    Endpoint for retrieving posts page by page, ordered by id
+    :param limit: Page size
+    :param cursor: Opaque cursor, pointing to the last post of previous page
     :param db: Current db Session object
-    :return: Dict with all posts from database
+    :return: Dict with posts page and cursor for the next page
     """
     try:
-        posts = db.query(PostModel).all()
-        return posts
+        query = select(PostModel).order_by(PostModel.id)
+        if cursor is not None:
+            query = query.filter(PostModel.id > _decode_post_cursor(cursor))
+
+        # Fetch one extra row to find out, if there is a next page
+        posts = (await db.scalars(query.limit(limit + 1))).all()
+        next_cursor = encode_cursor({"id": posts[limit - 1].id}) if len(posts) > limit else None
+
+        return {"items": posts[:limit], "next_cursor": next_cursor}
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500,
@@ -35,17 +60,41 @@ async def list_posts(
 @router.get("/posts/{post_id}", response_model=PostSchema)
 async def get_post(
         post_id: int,
-        db: Session = Depends(get_db)
+        request: Request,
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Endpoint for retrieving specific post by id
+    Endpoint for retrieving specific post by id.
+
+    Response has weak ETag of post version. Request with matching If-None-Match is answered with 304.
+    Serialized post is cached by its version, so hot posts are served without database.
     :param post_id: Post ID
+    :param request: Current request
     :param db: Current database Session object
     :return: Retrieved ost model
     """
     try:
-        post = db.query(PostModel).filter(PostModel.id == post_id).first()
-        return post
+        # Post version is usually cached, so poller with up-to-date post doesn't cost a query
+        version = await post_versions.get(db, post_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        etag = weak_etag("post", post_id, version)
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        cache_key = ("post", post_id, version)
+        body = post_versions.responses.get(cache_key)
+        if body is None:
+            post = await db.scalar(select(PostModel).filter(PostModel.id == post_id))
+            if post is None:
+                # Cached version may outlive post, deleted e.g. by another worker
+                post_versions.invalidate(post_id)
+                raise HTTPException(status_code=404, detail="Post not found")
+            body = PostSchema.model_validate(post, from_attributes=True).model_dump_json().encode()
+            post_versions.responses.set(cache_key, body, group=post_id)
+
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500,
@@ -55,8 +104,8 @@ async def get_post(
 @router.post("/posts", response_model=PostSchema, status_code=201)
 async def create_post(
         post: PostCreate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
 ) -> PostModel:
     """
     Endpoint for creating post
@@ -74,8 +123,8 @@ async def create_post(
 
         db_post = PostModel(**post.dict(), owner_id=current_user.id)
         db.add(db_post)
-        db.commit()
-        db.refresh(db_post)
+        await db.commit()
+        await db.refresh(db_post)
         return db_post
 
     except SQLAlchemyError as e:
@@ -87,8 +136,8 @@ async def create_post(
 async def update_post(
         post_id: int,
         post: PostUpdate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     Endpoint for updating post by its author
@@ -99,7 +148,7 @@ async def update_post(
     :return: Updated post
     """
     try:
-        db_post = db.query(PostModel).filter(PostModel.id == post_id).first()
+        db_post = await db.scalar(select(PostModel).filter(PostModel.id == post_id))
 
         if db_post is None:
             raise HTTPException(status_code=404, detail="Post not found")
@@ -109,17 +158,22 @@ async def update_post(
             raise HTTPException(status_code=403,
                                 detail="Post can be updated only by its author.")
 
-        # Call moderation service to check for potential harmfulness of content and check moderation result
-        moderation_result = await moderation_service.moderate_content(f"Title: {post.title}; Content: {post.content}")
+        # Call moderation service to check for potential harmfulness of content and check moderation result.
+        # Unchanged content has already passed moderation
+        if (post.title, post.content) != (db_post.title, db_post.content):
+            moderation_result = await moderation_service.moderate_content(
+                f"Title: {post.title}; Content: {post.content}"
+            )
 
-        if moderation_result.get("flagged"):
-            raise HTTPException(status_code=422, detail="Content is flagged by moderation")
+            if moderation_result.get("flagged"):
+                raise HTTPException(status_code=422, detail="Content is flagged by moderation")
 
         for var, value in vars(post).items():
             setattr(db_post, var, value) if value else None
         db.add(db_post)
-        db.commit()
-        db.refresh(db_post)
+        await post_versions.bump(db, post_id)
+        await db.commit()
+        await db.refresh(db_post)
         return db_post
 
     except SQLAlchemyError as e:
@@ -129,8 +183,8 @@ async def update_post(
 
 @router.delete("/posts/{post_id}", response_model=dict)
 async def delete_post(post_id: int,
-                db: Session = Depends(get_db),
-                current_user: User = Depends(get_current_user)
+                db: AsyncSession = Depends(get_async_db),
+                current_user: CurrentUser = Depends(get_current_user)
                 ) -> dict:
     """
     Endpoint for deleting post by its author
@@ -141,15 +195,16 @@ async def delete_post(post_id: int,
     """
 
     try:
-        post = db.query(PostModel).filter(PostModel.id == post_id).first()
+        post = await db.scalar(select(PostModel).filter(PostModel.id == post_id))
 
         # Check if current user is post author
         if post.owner_id != current_user.id:
             raise HTTPException(status_code=403, detail="Post can be deleted only by its author.")
 
         # Delete the post from the database
-        db.delete(post)
-        db.commit()
+        await db.delete(post)
+        post_versions.invalidate_on_commit(db, post_id)
+        await db.commit()
 
         return {"detail": "Post deleted successfully."}
     except SQLAlchemyError as e:
@@ -0,0 +1,134 @@
+import math
+import re
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..schemas.search import SearchPage as SearchPageSchema
+from ..database import get_async_db
+from ..core.config import settings
+from ..core.pagination import encode_cursor, decode_cursor
+
+router = APIRouter()
+
+# Matches of posts and comments, ranked by BM25. Post titles weigh twice as much as post content.
+# FTS5 returns negative BM25 scores, so the best matches have the lowest rank
+_POSTS_MATCH = """
+    SELECT 'post' AS type, rowid AS id, bm25(posts_fts, 2.0, 1.0) AS rank
+    FROM posts_fts
+    WHERE posts_fts MATCH :query
+"""
+_COMMENTS_MATCH = """
+    SELECT 'comment' AS type, rowid AS id, bm25(comments_fts) AS rank
+    FROM comments_fts
+    WHERE comments_fts MATCH :query
+"""
+
+# Snippets are built only for rows of the page, as building them for every match costs more than ranking
+_POSTS_SNIPPETS = text("""
+    SELECT rowid AS id, rowid AS post_id, snippet(posts_fts, -1, '<mark>', '</mark>', '…', :snippet_tokens) AS snippet
+    FROM posts_fts
+    WHERE posts_fts MATCH :query AND rowid IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+_COMMENTS_SNIPPETS = text("""
+    SELECT comments.id AS id, comments.post_id AS post_id,
+           snippet(comments_fts, 0, '<mark>', '</mark>', '…', :snippet_tokens) AS snippet
+    FROM comments_fts
+    JOIN comments ON comments.id = comments_fts.rowid
+    WHERE comments_fts MATCH :query AND comments_fts.rowid IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+_SNIPPET_TOKENS = 16
+
+
+def _match_query(q: str) -> str | None:
+    """
+    Turn user input into FTS5 query, matching documents that contain all words of it.
+    Words are quoted, so FTS5 syntax characters and keywords in input are searched as plain text
+    :return: FTS5 query, or None if input has no words
+    """
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{word}"' for word in words) if words else None
+
+
+def _decode_search_cursor(cursor: str) -> tuple[float, str, int]:
+    """Decode cursor of search results into (rank, type, id) of the last result of previous page"""
+    values = decode_cursor(cursor, "rank", "type", "id")
+    try:
+        rank, type_, id_ = float(values["rank"]), values["type"], int(values["id"])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not math.isfinite(rank) or type_ not in ("post", "comment"):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return rank, type_, id_
+
+
+@router.get("/search", response_model=SearchPageSchema)
+async def search(
+        q: str = Query(..., min_length=1, description="Words to search for"),
+        scope: Literal["all", "posts", "comments"] = Query("all", description="Kind of documents to search"),
+        limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE,
+                           description="Maximum amount of results in page"),
+        cursor: str | None = Query(None, description="Cursor from next_cursor of previous page"),
+        db: AsyncSession = Depends(get_async_db)
+) -> dict:
+    """
+    Endpoint for full-text search of posts and comments, containing all words of query.
+
+    Results are ordered by BM25 relevance, best first, and have snippets with matched words wrapped in <mark> tags.
+    :param q: Search query
+    :param scope: Search posts, comments or both of them
+    :param limit: Page size
+    :param cursor: Opaque cursor, pointing to the last result of previous page
+    :param db: Current db Session object
+    :return: Dict with results page and cursor for the next page
+    """
+    query = _match_query(q)
+    if query is None:
+        return {"items": [], "next_cursor": None}
+
+    params = {"query": query, "limit": limit + 1}
+    keyset = ""
+    if cursor is not None:
+        after_rank, after_type, after_id = _decode_search_cursor(cursor)
+        keyset = "WHERE (rank, type, id) > (:after_rank, :after_type, :after_id)"
+        params.update(after_rank=after_rank, after_type=after_type, after_id=after_id)
+
+    # Each kind of documents is limited to a page before merging, so only page rows are sorted across them
+    parts = []
+    if scope in ("all", "posts"):
+        parts.append(_POSTS_MATCH)
+    if scope in ("all", "comments"):
+        parts.append(_COMMENTS_MATCH)
+    statement = " UNION ALL ".join(f"SELECT * FROM (SELECT * FROM ({part}) {keyset} ORDER BY rank, id LIMIT :limit)"
+                                   for part in parts)
+    statement = f"SELECT type, id, rank FROM ({statement}) ORDER BY rank, type, id LIMIT :limit"
+
+    try:
+        # Fetch one extra row to find out, if there is a next page
+        rows = (await db.execute(text(statement), params)).mappings().all()
+
+        page = rows[:limit]
+        details = {}
+        for type_, snippets_statement in (("post", _POSTS_SNIPPETS), ("comment", _COMMENTS_SNIPPETS)):
+            ids = [row["id"] for row in page if row["type"] == type_]
+            if ids:
+                result = await db.execute(snippets_statement,
+                                          {"query": query, "snippet_tokens": _SNIPPET_TOKENS, "ids": ids})
+                details.update({(type_, row["id"]): row for row in result.mappings()})
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500,
+                            detail=f"An error occurred while trying to search: {e}")
+
+    # Documents, deleted between the two queries, are skipped
+    items = [{**row, **details[(row["type"], row["id"])]} for row in page if (row["type"], row["id"]) in details]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor({"rank": last["rank"], "type": last["type"], "id": last["id"]})
+
+    return {"items": items, "next_cursor": next_cursor}
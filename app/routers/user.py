@@ -3,9 +3,10 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..models import UserProfile
-from ..database import get_db
+from ..database import get_async_db
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -15,7 +16,7 @@ router = APIRouter()
 @router.get("/profile/{user_id}")
 async def get_user_profile(
         user_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint for retrieving user profile by id
@@ -24,7 +25,7 @@ async def get_user_profile(
     :return: User profile
     """
     try:
-        user_profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+        user_profile = await db.scalar(select(UserProfile).filter(UserProfile.user_id == user_id))
         if user_profile is None:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -1,3 +1,5 @@
 from .user import User, UserProfile, UserCreate
-from .post import Post, PostCreate, PostUpdate
-from .comment import Comment, BlockedComment, CommentCreate, CommentUpdate
+from .post import Post, PostCreate, PostUpdate, PostPage
+from .comment import Comment, BlockedComment, CommentCreate, CommentUpdate, CommentPage
+from .comment import CommentBatchCreate, CommentBatchItem, CommentBatchResult
+from .search import SearchResult, SearchPage
@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 
@@ -31,3 +33,25 @@ class BlockedComment(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class CommentPage(BaseModel):
+    items: list[Comment]
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+
+class CommentBatchCreate(BaseModel):
+    comments: list[CommentCreate] = Field(..., min_length=1)
+
+
+class CommentBatchItem(BaseModel):
+    index: int
+    status: Literal["created", "blocked"]
+    comment: BlockedComment | Comment
+
+
+class CommentBatchResult(BaseModel):
+    items: list[CommentBatchItem]
+    created: int
+    blocked: int
@@ -19,3 +19,8 @@ class Post(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class PostPage(BaseModel):
+    items: list[Post]
+    next_cursor: str | None = None
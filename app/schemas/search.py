@@ -0,0 +1,16 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class SearchResult(BaseModel):
+    type: Literal["post", "comment"]
+    id: int
+    post_id: int
+    snippet: str
+    rank: float
+
+
+class SearchPage(BaseModel):
+    items: list[SearchResult]
+    next_cursor: str | None = None
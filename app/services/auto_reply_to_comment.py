@@ -1,16 +1,10 @@
 import time
 
 import httpx
-from sqlalchemy.exc import SQLAlchemyError
 
 from ..core.config import settings
-from datetime import datetime
-
-from fastapi import Depends, HTTPException
-
-from sqlalchemy.orm import Session
-
-from ..models.comment import Comment as CommentModel
+from ..core.http_client import use_http_client
+from ..core.metrics import record_outbound_call
 
 
 class AutoReplyToCommentService:
@@ -18,13 +12,16 @@ class AutoReplyToCommentService:
     Service, that handles auto-reply feature. Called in comment creation, if author of the post
     enabled this feature.
 
-    Sends post content and comment content to OpenAI API to create new comment content,
-    and adds resulting comment to database after given delay.
+    Sends post content and comment content to OpenAI API to create new comment content.
+    Resulting comment is published after given delay by reply scheduler.
     """
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, http_client: httpx.AsyncClient | None = None,
+                 api_base_url: str = "https://api.openai.com/v1"):
         self.api_key = api_key
-        self.base_url = "https://api.openai.com/v1/chat/completions"
+        self.base_url = f"{api_base_url.rstrip('/')}/chat/completions"
         self.model = "gpt-3.5-turbo"
+        # Shared pooled client, set in application lifespan
+        self.http_client = http_client
 
     async def get_reply_string(
             self,
@@ -79,45 +76,17 @@ class AutoReplyToCommentService:
             "max_tokens": 150
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.base_url, json=data, headers=headers)
+        async with use_http_client(self.http_client) as client:
+            started = time.perf_counter()
+            status = "error"
+            try:
+                response = await client.post(self.base_url, json=data, headers=headers)
+                status = response.status_code
+            finally:
+                record_outbound_call("auto_reply", status, time.perf_counter() - started)
             response.raise_for_status()
             return response.json()["choices"][0]["message"]["content"].strip()
 
-    async def reply_with_delay(
-            self,
-            delay_min: int,
-            reply_comment_str: str,
-            author_id: str,
-            post_id: str,
-            db: Session,
-    ):
-        """
-        Wait for specified amount of time and save generated by LLM comment into database.
-        :param delay_min: Delay time, in minutes
-        :param reply_comment_str: Content of generated by LLM comment
-        :param author_id: Id of author of the post and comment
-        :param post_id: ID of post
-        :param db: Current database Session object
-        :return:
-        """
-
-        if delay_min:
-            time.sleep(delay_min * 60)
-
-        try:
-            db_comment = CommentModel(
-                content=reply_comment_str,
-                created_at=datetime.now(),
-                owner_id=author_id,
-                post_id=post_id
-            )
-
-            db.add(db_comment)
-            db.commit()
-        except SQLAlchemyError as e:
-            raise HTTPException(status_code=500,
-                                detail=f"An error occurred while trying to save delayed comment for {post_id}: {e}")
-
 
-auto_reply_to_comment_service = AutoReplyToCommentService(api_key=settings.OPENAI_API_KEY)
+auto_reply_to_comment_service = AutoReplyToCommentService(api_key=settings.OPENAI_API_KEY,
+                                                          api_base_url=settings.OPENAI_BASE_URL)
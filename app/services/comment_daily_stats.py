@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from sqlalchemy import Connection, delete, func, insert, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.comment import Comment as CommentModel
+from ..models.comment import BlockedComment as BlockedCommentModel
+from ..models.comment import CommentDailyStats
+
+
+async def update_comment_daily_stats(
+        db: AsyncSession,
+        post_id: int,
+        created_at: datetime,
+        comments_delta: int = 0,
+        blocked_delta: int = 0
+) -> None:
+    """
+    Add deltas to comment_daily_stats row of given post and day, creating the row if needed.
+
+    Statement is executed in the current transaction of the session, so rollup is committed together with comment.
+    :param db: Current database Session object
+    :param post_id: Id of the post comment belongs to
+    :param created_at: Creation time of the comment
+    :param comments_delta: Change of comments amount, e.g. 1 for created comment and -1 for deleted one
+    :param blocked_delta: Change of blocked comments amount
+    """
+    statement = sqlite_insert(CommentDailyStats).values(
+        date=created_at.date(),
+        post_id=post_id,
+        comment_count=comments_delta,
+        blocked_count=blocked_delta
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[CommentDailyStats.date, CommentDailyStats.post_id],
+        set_={
+            "comment_count": CommentDailyStats.comment_count + statement.excluded.comment_count,
+            "blocked_count": CommentDailyStats.blocked_count + statement.excluded.blocked_count,
+        }
+    )
+    await db.execute(statement)
+
+
+def rebuild_comment_daily_stats(connection: Connection) -> int:
+    """
+    Recalculate whole comment_daily_stats table from comments and blocked_comments tables.
+    :param connection: Database connection, statements are executed in its current transaction
+    :return: Amount of written rollup rows
+    """
+    per_comment = union_all(
+        select(func.date(CommentModel.created_at).label("date"), CommentModel.post_id,
+               literal(1).label("comment_count"), literal(0).label("blocked_count"))
+        .filter(CommentModel.post_id.is_not(None)),
+        select(func.date(BlockedCommentModel.created_at).label("date"), BlockedCommentModel.post_id,
+               literal(0).label("comment_count"), literal(1).label("blocked_count"))
+        .filter(BlockedCommentModel.post_id.is_not(None)),
+    ).subquery()
+
+    connection.execute(delete(CommentDailyStats))
+    result = connection.execute(insert(CommentDailyStats).from_select(
+        ["date", "post_id", "comment_count", "blocked_count"],
+        select(per_comment.c.date, per_comment.c.post_id,
+               func.sum(per_comment.c.comment_count), func.sum(per_comment.c.blocked_count))
+        .group_by(per_comment.c.date, per_comment.c.post_id)
+    ))
+    return result.rowcount
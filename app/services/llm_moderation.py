@@ -1,24 +1,189 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
 import httpx
 from ..core.config import settings
+from ..core.http_client import use_http_client
+from ..core.metrics import moderation_batch_size, record_outbound_call
+from .moderation_cache import ModerationCache, create_moderation_cache
+
+
+class ModerationBatcher:
+    """
+    Coalescer of concurrent moderation requests into batched API calls.
+
+    Contents submitted while a batch is collecting are sent together, once batch reaches `max_batch_size` items
+    or `max_wait_ms` passes since its first item, whichever comes first. Each caller gets result for its own
+    content. Identical contents within a batch are sent once.
+    """
+
+    def __init__(self,
+                 send_batch: Callable[[list[str]], Awaitable[list[dict]]],
+                 max_batch_size: int,
+                 max_wait_ms: float):
+        """
+        :param send_batch: Coroutine function, moderating list of contents with single call
+        :param max_batch_size: Maximum amount of distinct contents in single call
+        :param max_wait_ms: Maximum time first content of batch waits for others, in milliseconds
+        """
+        self._send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, content: str) -> dict:
+        """
+        Add content to current batch and wait for its moderation result
+        :param content: Content to moderate
+        :return: Moderation result for content
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(content, []).append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Send collected batch in background task"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: dict[str, list[asyncio.Future]]) -> None:
+        """Moderate batch and fan results out to waiting callers. Every caller gets result or exception"""
+        contents = list(batch)
+        error: BaseException | None = None
+        try:
+            results = await self._send_batch(contents)
+            if not isinstance(results, list) or len(results) != len(contents):
+                raise ValueError(f"Expected {len(contents)} moderation results, "
+                                 f"got {len(results) if isinstance(results, list) else results!r}")
+
+            for content, result in zip(contents, results):
+                for future in batch[content]:
+                    if not future.done():
+                        future.set_result(result)
+        except Exception as e:
+            error = e
+        finally:
+            # Futures are left pending only on error or cancellation of the task
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        if error is None:
+                            future.cancel()
+                        else:
+                            future.set_exception(error)
 
 
 class ModerationService:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache: ModerationCache | None = None,
+                 max_batch_size: int = 1, max_batch_wait_ms: float = 0,
+                 http_client: httpx.AsyncClient | None = None,
+                 api_base_url: str = "https://api.openai.com/v1"):
         self.api_key = api_key
-        self.base_url = "https://api.openai.com/v1/moderations"
+        self.base_url = f"{api_base_url.rstrip('/')}/moderations"
+        self.cache = cache
+        # Shared pooled client, set in application lifespan
+        self.http_client = http_client
+        self.max_batch_size = max(max_batch_size, 1)
+
+        # Batch of single item means no batching, every content is sent right away
+        self.batcher = None
+        if max_batch_size > 1:
+            self.batcher = ModerationBatcher(self.moderate_batch, max_batch_size, max_batch_wait_ms)
 
     async def moderate_content(self, content: str) -> dict:
+        # Identical content gets the same verdict, so don't pay for remote call again
+        if self.cache is not None:
+            cached_result = await self.cache.get(content)
+            if cached_result is not None:
+                return cached_result
+
+        if self.batcher is not None:
+            result = await self.batcher.submit(content)
+        else:
+            result = (await self.moderate_batch([content]))[0]
+
+        if self.cache is not None:
+            await self.cache.set(content, result)
+        return result
+
+    async def moderate_contents(self, contents: list[str]) -> list[dict]:
+        """
+        Moderate several contents at once, e.g. of bulk created comments.
+        Cached verdicts are reused, and the rest of distinct contents are sent in API calls of up to `max_batch_size`
+        contents, one after another
+        :param contents: Contents to moderate
+        :return: Moderation results in the same order as contents
+        """
+        results: dict[str, dict] = {}
+        if self.cache is not None:
+            for content in dict.fromkeys(contents):
+                cached_result = await self.cache.get(content)
+                if cached_result is not None:
+                    results[content] = cached_result
+
+        missing = [content for content in dict.fromkeys(contents) if content not in results]
+        for start in range(0, len(missing), self.max_batch_size):
+            batch = missing[start:start + self.max_batch_size]
+            for content, result in zip(batch, await self.moderate_batch(batch)):
+                results[content] = result
+                if self.cache is not None:
+                    await self.cache.set(content, result)
+
+        return [results[content] for content in contents]
+
+    async def moderate_batch(self, contents: list[str]) -> list[dict]:
+        """
+        Moderate several contents with single API call
+        :param contents: Contents to moderate
+        :return: Moderation results in the same order as contents
+        """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
         data = {
-            "input": content,
+            "input": contents,
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.base_url, json=data, headers=headers)
+        moderation_batch_size.observe(len(contents))
+        async with use_http_client(self.http_client) as client:
+            started = time.perf_counter()
+            status = "error"
+            try:
+                response = await client.post(self.base_url, json=data, headers=headers)
+                status = response.status_code
+            finally:
+                record_outbound_call("moderation", status, time.perf_counter() - started)
             response.raise_for_status()
-            return response.json().get("results")[0]
+
+        results = response.json().get("results")
+        if not isinstance(results, list) or len(results) != len(contents):
+            raise ValueError(f"Expected {len(contents)} moderation results, "
+                             f"got {len(results) if isinstance(results, list) else results!r}")
+        return results
 
 
-moderation_service = ModerationService(api_key=settings.OPENAI_API_KEY)
+moderation_service = ModerationService(api_key=settings.OPENAI_API_KEY,
+                                       api_base_url=settings.OPENAI_BASE_URL,
+                                       cache=create_moderation_cache(),
+                                       max_batch_size=settings.MODERATION_BATCH_MAX_SIZE,
+                                       max_batch_wait_ms=settings.MODERATION_BATCH_MAX_WAIT_MS)
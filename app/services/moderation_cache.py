@@ -0,0 +1,182 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from typing import Protocol
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..core.cache import TTLCache
+from ..core.config import settings
+from ..database import AsyncSessionLocal
+from ..models.moderation import ModerationCacheEntry
+
+
+def content_hash(content: str) -> str:
+    """
+    Hash of normalized content, so contents differing only in case, unicode form or whitespace share a cache entry
+    :param content: Content to moderate
+    :return: Hex SHA-256 digest
+    """
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", content)).strip().casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class ModerationCacheBackend(Protocol):
+    """Storage of moderation results by content hash"""
+
+    async def get(self, key: str) -> dict | None:
+        ...
+
+    async def set(self, key: str, result: dict) -> None:
+        ...
+
+    def stats(self) -> dict:
+        ...
+
+
+class InMemoryModerationCacheBackend:
+    """Moderation results cache in memory of current process"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    async def get(self, key: str) -> dict | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, result: dict) -> None:
+        self._cache.set(key, result)
+
+    def stats(self) -> dict:
+        return {"size": len(self._cache), "evictions": self._cache.evictions}
+
+
+class SQLiteModerationCacheBackend:
+    """
+    Moderation results cache in moderation_cache table, shared by all workers using the same database.
+
+    Last usage time is refreshed at most once per `touch_interval`, so cache hits don't turn into a write each.
+    Expired and least recently used entries are pruned once per `prune_every` writes.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, max_size: int, ttl: float,
+                 touch_interval: float = 60, prune_every: int = 100):
+        self._session_factory = session_factory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.prune_every = prune_every
+        self._writes = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> dict | None:
+        now = time.time()
+        async with self._session_factory() as db:
+            entry = await db.get(ModerationCacheEntry, key)
+            if entry is None or entry.expires_at <= now:
+                return None
+
+            if now - entry.last_used_at > self.touch_interval:
+                await db.execute(update(ModerationCacheEntry)
+                                 .filter(ModerationCacheEntry.content_hash == key)
+                                 .values(last_used_at=now))
+                await db.commit()
+
+            return json.loads(entry.result)
+
+    async def set(self, key: str, result: dict) -> None:
+        now = time.time()
+        statement = sqlite_insert(ModerationCacheEntry).values(
+            content_hash=key, result=json.dumps(result), expires_at=now + self.ttl, last_used_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[ModerationCacheEntry.content_hash],
+            set_={"result": statement.excluded.result,
+                  "expires_at": statement.excluded.expires_at,
+                  "last_used_at": statement.excluded.last_used_at}
+        )
+
+        async with self._session_factory() as db:
+            await db.execute(statement)
+
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                await self._prune(db, now)
+
+            await db.commit()
+
+    async def _prune(self, db, now: float) -> None:
+        """Delete expired entries and least recently used ones above max size"""
+        expired = await db.execute(delete(ModerationCacheEntry).filter(ModerationCacheEntry.expires_at <= now))
+        self.evictions += expired.rowcount
+
+        size = await db.scalar(select(func.count()).select_from(ModerationCacheEntry))
+        if size > self.max_size:
+            least_recently_used = (select(ModerationCacheEntry.content_hash)
+                                   .order_by(ModerationCacheEntry.last_used_at)
+                                   .limit(size - self.max_size))
+            evicted = await db.execute(delete(ModerationCacheEntry)
+                                       .filter(ModerationCacheEntry.content_hash.in_(least_recently_used)))
+            self.evictions += evicted.rowcount
+
+    def stats(self) -> dict:
+        return {"evictions": self.evictions}
+
+
+class ModerationCache:
+    """Moderation results cache by normalized content hash, counting hits and misses"""
+
+    def __init__(self, backend: ModerationCacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, content: str) -> dict | None:
+        """
+        Get cached moderation result for content
+        :param content: Moderated content
+        :return: Moderation result, or None on miss
+        """
+        result = await self.backend.get(content_hash(content))
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def set(self, content: str, result: dict) -> None:
+        """Save moderation result for content"""
+        await self.backend.set(content_hash(content), result)
+
+    def stats(self) -> dict:
+        """Get hit and miss counters along with backend stats"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            **self.backend.stats(),
+        }
+
+
+def create_moderation_cache() -> ModerationCache | None:
+    """
+    Create moderation cache with backend from settings
+    :return: Moderation cache, or None if caching is disabled
+    """
+    if settings.MODERATION_CACHE_BACKEND == "memory":
+        return ModerationCache(InMemoryModerationCacheBackend(max_size=settings.MODERATION_CACHE_MAX_SIZE,
+                                                              ttl=settings.MODERATION_CACHE_TTL))
+    if settings.MODERATION_CACHE_BACKEND == "sqlite":
+        return ModerationCache(SQLiteModerationCacheBackend(AsyncSessionLocal,
+                                                            max_size=settings.MODERATION_CACHE_MAX_SIZE,
+                                                            ttl=settings.MODERATION_CACHE_TTL))
+    if settings.MODERATION_CACHE_BACKEND == "none":
+        return None
+
+    raise ValueError(f"Unknown moderation cache backend {settings.MODERATION_CACHE_BACKEND!r}, "
+                     f"expected one of memory, sqlite, none")
@@ -0,0 +1,101 @@
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.cache import ByteLRUCache, TTLCache
+from ..core.config import settings
+from ..models.post import Post as PostModel
+
+
+class PostVersions:
+    """
+    Version counters of posts, used as entity tags of post and its comments.
+
+    Version is stored in posts table and bumped in the same transaction with every change of post or its comments.
+    Read versions are cached in process, so conditional requests are answered without database. With several workers
+    other workers may see old version up to cache TTL.
+
+    Serialized responses for post and its comments pages are cached by version in `responses`, grouped by post id,
+    and are dropped together with cached version.
+    """
+
+    def __init__(self, max_size: int, ttl: float, responses_max_bytes: int):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self.responses = ByteLRUCache(max_bytes=responses_max_bytes)
+        # Loads of versions from database in progress and invalidations of their posts meanwhile, per post id.
+        # Entries are kept only while post is being loaded, so they don't grow with amount of posts
+        self._loads: dict[int, int] = {}
+        self._generations: dict[int, int] = {}
+
+    async def get(self, db: AsyncSession, post_id: int) -> int | None:
+        """
+        Get current version of post, from cache if possible
+        :param db: Current database Session object, used on cache miss
+        :param post_id: Post ID
+        :return: Version, or None if post doesn't exist
+        """
+        version = self._cache.get(post_id)
+        if version is None:
+            self._loads[post_id] = self._loads.get(post_id, 0) + 1
+            generation = self._generations.get(post_id, 0)
+            try:
+                version = await db.scalar(select(PostModel.version).filter(PostModel.id == post_id))
+            finally:
+                # Post invalidated while loading might have been read before the commit, so version is not cached
+                is_invalidated = self._generations.get(post_id, 0) != generation
+                self._loads[post_id] -= 1
+                if not self._loads[post_id]:
+                    del self._loads[post_id]
+                    self._generations.pop(post_id, None)
+            if version is not None and not is_invalidated:
+                self._cache.set(post_id, version)
+        return version
+
+    async def prime(self, db: AsyncSession, limit: int) -> int:
+        """
+        Cache versions of the newest posts, that are polled the most, e.g. by clients of restarted worker
+        :param db: Current database Session object
+        :param limit: Amount of posts
+        :return: Amount of cached versions
+        """
+        rows = (await db.execute(select(PostModel.id, PostModel.version)
+                                 .order_by(PostModel.id.desc())
+                                 .limit(limit))).all()
+        for post_id, version in rows:
+            self._cache.set(post_id, version)
+        return len(rows)
+
+    async def bump(self, db: AsyncSession, post_id: int) -> None:
+        """
+        Increase version of post in the current transaction of the session.
+        Cached version is dropped after commit. Readers of this worker, that loaded version before the commit, don't
+        cache it, while other workers may serve cached old version up to cache TTL
+        """
+        await db.execute(update(PostModel).filter(PostModel.id == post_id).values(version=PostModel.version + 1))
+        self.invalidate_on_commit(db, post_id)
+
+    def invalidate_on_commit(self, db: AsyncSession, post_id: int) -> None:
+        """Drop cached version and responses of post after the current transaction of the session is committed"""
+        event.listen(db.sync_session, "after_commit", lambda session: self.invalidate(post_id), once=True)
+
+    def invalidate(self, post_id: int) -> None:
+        """Drop cached version and responses of post"""
+        if post_id in self._loads:
+            self._generations[post_id] = self._generations.get(post_id, 0) + 1
+        self._cache.delete(post_id)
+        self.responses.invalidate_group(post_id)
+
+    def clear(self) -> None:
+        """Drop all cached versions and responses"""
+        for post_id in self._loads:
+            self._generations[post_id] = self._generations.get(post_id, 0) + 1
+        self._cache.clear()
+        self.responses.clear()
+
+    def stats(self) -> dict:
+        """Get sizes and counters of versions and responses caches"""
+        return {"versions": self._cache.stats(), "responses": self.responses.stats()}
+
+
+post_versions = PostVersions(max_size=settings.POST_VERSION_CACHE_MAX_SIZE,
+                             ttl=settings.POST_VERSION_CACHE_TTL,
+                             responses_max_bytes=settings.RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,262 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..core.config import settings
+from ..database import AsyncSessionLocal
+from ..models.comment import Comment as CommentModel
+from ..models.comment import ScheduledReply
+from ..models.post import Post as PostModel
+from .auto_reply_to_comment import AutoReplyToCommentService, auto_reply_to_comment_service
+from .comment_daily_stats import update_comment_daily_stats
+from .post_versions import post_versions
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyScheduler:
+    """
+    Generator and publisher of delayed auto-reply comments.
+
+    Replies are stored in scheduled_replies table. Reply content is generated by LLM in a bounded pool of worker tasks,
+    so comment creation doesn't wait for it. Generated replies are kept in memory only as due times and ids in a heap.
+    Scheduler task sleeps until the earliest due time, then publishes all due replies in batches on its own session.
+    Publishing deletes scheduled row in the same transaction, so a reply is published once even with several workers.
+
+    Every worker loads replies to generate on start, but generates only replies it claims, so each reply costs one
+    LLM call. Failed generation is retried with exponential backoff, and after `max_attempts` the reply is marked
+    as failed and is not generated anymore.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, reply_service: AutoReplyToCommentService,
+                 workers: int = 4, batch_size: int = 100, retry_delay: float = 60, max_attempts: int = 5,
+                 claim_timeout: float = 300):
+        """
+        :param session_factory: Factory of sessions for generating and publishing replies
+        :param reply_service: Service, generating reply content
+        :param workers: Maximum amount of replies generated concurrently
+        :param batch_size: Maximum amount of replies published in one transaction
+        :param retry_delay: Delay before next attempt to generate or publish replies after failure, in seconds.
+        Delay of generation is doubled after every failed attempt
+        :param max_attempts: Attempts to generate reply, before it is given up
+        :param claim_timeout: Time, after which reply claimed by other worker may be generated again, in seconds
+        """
+        self.session_factory = session_factory
+        self.reply_service = reply_service
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+
+        self._heap: list[tuple[datetime, int]] = []
+        self._wakeup = asyncio.Event()
+        self._queue: asyncio.Queue[int] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Load pending replies from database and start scheduler and generation worker tasks"""
+        async with self.session_factory() as db:
+            pending = (await db.execute(select(ScheduledReply.id, ScheduledReply.due_at,
+                                               ScheduledReply.content.is_not(None))
+                                        .filter(ScheduledReply.failed_at.is_(None)))).all()
+
+        self._heap = [(due_at, reply_id) for reply_id, due_at, is_generated in pending if is_generated]
+        heapq.heapify(self._heap)
+        self._wakeup = asyncio.Event()
+        self._queue = asyncio.Queue()
+        for reply_id, _, is_generated in pending:
+            if not is_generated:
+                self._queue.put_nowait(reply_id)
+
+        self._tasks = [asyncio.create_task(self._run())]
+        self._tasks += [asyncio.create_task(self._generate_worker()) for _ in range(self.workers)]
+        logger.info("Reply scheduler started with %s pending replies, %s of them to generate",
+                    len(pending), self._queue.qsize())
+
+    async def stop(self) -> None:
+        """Stop scheduler tasks. Pending replies stay in database until next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def schedule(self, db: AsyncSession, comment_id: int, delay_min: int, author_id: int,
+                 post_id: int) -> ScheduledReply:
+        """
+        Add reply to comment to session. Reply is published after both delay passes and content is generated.
+        Caller commits it together with the comment and then passes it to `enqueue`
+        :param db: Current database Session object
+        :param comment_id: Id of comment to reply to
+        :param delay_min: Delay time, in minutes
+        :param author_id: Id of reply author, i.e. post author
+        :param post_id: Id of post to publish reply to
+        :return: Scheduled reply
+        """
+        scheduled_reply = ScheduledReply(comment_id=comment_id,
+                                         due_at=datetime.now() + timedelta(minutes=delay_min or 0),
+                                         author_id=author_id,
+                                         post_id=post_id)
+        db.add(scheduled_reply)
+        return scheduled_reply
+
+    def enqueue(self, scheduled_reply: ScheduledReply) -> None:
+        """Enqueue generation of committed scheduled reply"""
+        # Without running scheduler reply stays in database and is generated after start
+        if self._queue is not None:
+            self._queue.put_nowait(scheduled_reply.id)
+
+    def _push(self, due_at: datetime, reply_id: int) -> None:
+        """Add generated reply to heap, waking scheduler up if reply is due before current earliest one"""
+        is_earliest = not self._heap or due_at < self._heap[0][0]
+        heapq.heappush(self._heap, (due_at, reply_id))
+        if is_earliest:
+            self._wakeup.set()
+
+    async def _generate_worker(self) -> None:
+        """Take replies from queue one by one and generate their content"""
+        while True:
+            reply_id = await self._queue.get()
+            try:
+                await self._generate(reply_id)
+            except Exception:
+                logger.exception("Failed to generate scheduled reply %s", reply_id)
+                await self._retry_later(reply_id)
+            finally:
+                self._queue.task_done()
+
+    async def _claim(self, db: AsyncSession, reply_id: int) -> bool:
+        """
+        Claim reply for generation by this worker
+        :return: False if reply is generated, given up or being generated by another worker
+        """
+        now = datetime.now()
+        claimed = await db.scalar(update(ScheduledReply)
+                                  .filter(ScheduledReply.id == reply_id,
+                                          ScheduledReply.content.is_(None),
+                                          ScheduledReply.failed_at.is_(None),
+                                          or_(ScheduledReply.claimed_at.is_(None),
+                                              ScheduledReply.claimed_at < now - timedelta(seconds=self.claim_timeout)))
+                                  .values(claimed_at=now)
+                                  .returning(ScheduledReply.id))
+        await db.commit()
+        return claimed is not None
+
+    async def _retry_later(self, reply_id: int) -> None:
+        """Count failed generation attempt and retry it after backoff, or give reply up after the last attempt"""
+        attempts = 1
+        try:
+            async with self.session_factory() as db:
+                attempts = await db.scalar(update(ScheduledReply)
+                                           .filter(ScheduledReply.id == reply_id)
+                                           .values(attempts=ScheduledReply.attempts + 1,
+                                                   claimed_at=None,
+                                                   failed_at=case((ScheduledReply.attempts + 1 >= self.max_attempts,
+                                                                   datetime.now()),
+                                                                  else_=None))
+                                           .returning(ScheduledReply.attempts))
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to record failed generation of scheduled reply %s", reply_id)
+
+        if attempts is None:
+            return
+        if attempts >= self.max_attempts:
+            logger.error("Scheduled reply %s failed %s times, giving up", reply_id, attempts)
+            return
+
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        logger.info("Retrying generation of scheduled reply %s in %s seconds, attempt %s of %s",
+                    reply_id, delay, attempts + 1, self.max_attempts)
+        asyncio.get_running_loop().call_later(delay, self._requeue, reply_id)
+
+    def _requeue(self, reply_id: int) -> None:
+        """Put reply to generation queue again, unless scheduler was stopped meanwhile"""
+        if self._queue is not None:
+            self._queue.put_nowait(reply_id)
+
+    async def _generate(self, reply_id: int) -> None:
+        """Claim reply, generate its content by LLM, save it and put reply to heap"""
+        async with self.session_factory() as db:
+            if not await self._claim(db, reply_id):
+                return
+
+            row = (await db.execute(select(ScheduledReply.due_at, PostModel.content, CommentModel.content)
+                                    .join(PostModel, PostModel.id == ScheduledReply.post_id)
+                                    .join(CommentModel, CommentModel.id == ScheduledReply.comment_id)
+                                    .filter(ScheduledReply.id == reply_id))).one_or_none()
+            if row is None:
+                # Comment or post was deleted, so there is nothing to reply to
+                await db.execute(delete(ScheduledReply).filter(ScheduledReply.id == reply_id))
+                await db.commit()
+                return
+
+            due_at, post_content, comment_content = row
+            # Release connection, so it isn't held while waiting for LLM
+            await db.rollback()
+            content = await self.reply_service.get_reply_string(post_content=post_content,
+                                                                comment_to_reply_content=comment_content)
+
+            await db.execute(update(ScheduledReply)
+                             .filter(ScheduledReply.id == reply_id)
+                             .values(content=content, claimed_at=None))
+            await db.commit()
+
+        self._push(due_at, reply_id)
+
+    async def _run(self) -> None:
+        """Sleep until the earliest due time and publish due replies"""
+        while True:
+            now = datetime.now()
+            if self._heap and self._heap[0][0] <= now:
+                reply_ids = []
+                while self._heap and self._heap[0][0] <= now and len(reply_ids) < self.batch_size:
+                    reply_ids.append(heapq.heappop(self._heap)[1])
+                await self._publish(reply_ids)
+                continue
+
+            timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+    async def _publish(self, reply_ids: list[int]) -> None:
+        """Turn scheduled replies into comments in one transaction, retrying later on failure"""
+        try:
+            async with self.session_factory() as db:
+                # Rows, already published by another worker, are not returned
+                claimed = (await db.execute(delete(ScheduledReply)
+                                            .filter(ScheduledReply.id.in_(reply_ids),
+                                                    ScheduledReply.content.is_not(None))
+                                            .returning(ScheduledReply.content, ScheduledReply.author_id,
+                                                       ScheduledReply.post_id))).all()
+
+                created_at = datetime.now()
+                for content, author_id, post_id in claimed:
+                    db.add(CommentModel(content=content, created_at=created_at, owner_id=author_id, post_id=post_id))
+                    await update_comment_daily_stats(db, post_id, created_at, comments_delta=1)
+                for post_id in {post_id for _, _, post_id in claimed}:
+                    await post_versions.bump(db, post_id)
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to publish %s scheduled replies, retrying in %s seconds",
+                             len(reply_ids), self.retry_delay)
+            retry_at = datetime.now() + timedelta(seconds=self.retry_delay)
+            for reply_id in reply_ids:
+                self._push(retry_at, reply_id)
+
+
+reply_scheduler = ReplyScheduler(AsyncSessionLocal,
+                                 reply_service=auto_reply_to_comment_service,
+                                 workers=settings.AUTO_REPLY_WORKERS,
+                                 batch_size=settings.REPLY_SCHEDULER_BATCH_SIZE,
+                                 retry_delay=settings.AUTO_REPLY_RETRY_DELAY,
+                                 max_attempts=settings.AUTO_REPLY_MAX_ATTEMPTS,
+                                 claim_timeout=settings.AUTO_REPLY_CLAIM_TIMEOUT)
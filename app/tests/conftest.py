@@ -1,19 +1,38 @@
 # Test setup configuration
 
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from ..main import app
-from ..database import get_db, Base
+from ..database import get_db, get_async_db, get_async_sessionmaker, Base, apply_storage_profile
+from ..core.query_stats import instrument_engine, track_requests
+from ..core.security import user_cache
+from ..services.post_versions import post_versions
+from ..services.reply_scheduler import reply_scheduler
 
 
 # Setting up a test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./app/tests/db/test.db"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./app/tests/db/test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs every request in its own event loop, so async connections are not pooled between them
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Use the same SQLite PRAGMAs as application engines
+apply_storage_profile(engine)
+apply_storage_profile(async_engine.sync_engine)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 # Create the test database
 Base.metadata.create_all(bind=engine)
 
@@ -27,7 +46,15 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_async_sessionmaker] = lambda: AsyncTestingSessionLocal
+reply_scheduler.session_factory = AsyncTestingSessionLocal
 
 client = TestClient(app)
 
@@ -88,6 +115,9 @@ def create_user(user: TestUserCredentials | TestSecondUserCredentials):
 def test_client():
     yield client
     Base.metadata.drop_all(bind=engine)
+    # Users and posts of next module get reused ids, so cached ones are stale
+    user_cache.clear()
+    post_versions.clear()
 
 
 # Create database when launching tests
@@ -98,3 +128,25 @@ def create_test_db():
     Base.metadata.drop_all(bind=engine)
 
 
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Context manager, asserting that every request made within it executes at most given amount of statements.
+
+    Usage:
+        with query_budget(3):
+            test_client.get("api/posts")
+    """
+    @contextmanager
+    def check(max_queries: int):
+        with track_requests() as finished:
+            yield finished
+        for stats in finished:
+            assert stats.count <= max_queries, (
+                f"{stats.method} {stats.route} executed {stats.count} statements, budget is {max_queries}: "
+                f"{dict(stats.shapes)}"
+            )
+
+    return check
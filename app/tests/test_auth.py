@@ -1,4 +1,12 @@
+import asyncio
+import time
+
+import pytest
+
 from .conftest import TestUserCredentials
+from ..core.config import settings
+from ..core.executor import BoundedExecutor, ExecutorSaturatedError
+from ..core.security import pwd_context, user_cache, verify_and_update_password
 
 user = TestUserCredentials()
 
@@ -128,6 +136,36 @@ def test_my_profile(create_test_db, test_client):
     assert "bio" in data
 
 
+def test_current_user_cache(create_test_db, test_client):
+    """
+    Test authenticated users cache.
+
+    This test ensures, that repeated requests with the same token are authenticated from cache,
+    and that token of old username stops working after username change.
+    """
+    hits = user_cache.hits
+    for _ in range(2):
+        response = test_client.get("api/my-profile", headers={"Authorization": user.access_token})
+        assert response.status_code == 200
+    assert user_cache.hits > hits
+
+    # Rename user, old token must be rejected
+    response = test_client.patch("api/user", headers={"Authorization": user.access_token},
+                                 json={"username": "renameduser"})
+    assert response.status_code == 200
+    response = test_client.get("api/my-profile", headers={"Authorization": user.access_token})
+    assert response.status_code == 401
+
+    # Rename user back with token of new username, so old token is valid again
+    login_response = test_client.post("api/login/", data={"username": "renameduser", "password": user.password})
+    renamed_token = f'Bearer {login_response.json()["access_token"]}'
+    response = test_client.patch("api/user", headers={"Authorization": renamed_token},
+                                 json={"username": user.username})
+    assert response.status_code == 200
+    response = test_client.get("api/my-profile", headers={"Authorization": user.access_token})
+    assert response.status_code == 200
+
+
 def test_delete_user(create_test_db, test_client):
     """
     Test user deletion endpoint.
@@ -148,3 +186,58 @@ def test_delete_user(create_test_db, test_client):
 
     # Verify successful deletion message
     assert data["message"] == f"User {user.username} was deleted successfully"
+
+    # Verify, that token of deleted user is not accepted from cache
+    response = test_client.get("api/my-profile", headers={"Authorization": user.access_token})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_password_executor_saturation():
+    """Test, that calls above executor workers and queue size are rejected instead of waiting"""
+    executor = BoundedExecutor(max_workers=1, max_queue=1)
+
+    running = asyncio.gather(executor.run(time.sleep, 0.2), executor.run(time.sleep, 0.2))
+    await asyncio.sleep(0)
+    with pytest.raises(ExecutorSaturatedError):
+        await executor.run(time.sleep, 0.2)
+
+    await running
+    assert executor.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_password_executor_cancelled_call():
+    """Test, that running call keeps its executor slot after its caller is cancelled, until its thread finishes"""
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+
+    caller = asyncio.create_task(executor.run(time.sleep, 0.2))
+    await asyncio.sleep(0.05)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+
+    assert executor.in_flight == 1
+    with pytest.raises(ExecutorSaturatedError):
+        await executor.run(time.sleep, 0)
+
+    await asyncio.sleep(0.3)
+    assert executor.in_flight == 0
+    await executor.run(time.sleep, 0)
+
+
+@pytest.mark.asyncio
+async def test_password_rehash_on_cost_change():
+    """Test, that valid password hashed with outdated bcrypt cost gets new hash with configured cost"""
+    outdated_hash = pwd_context.hash("testpassword", rounds=4)
+
+    is_valid, new_hash = await verify_and_update_password("testpassword", outdated_hash)
+    assert is_valid
+    assert new_hash.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+    is_valid, new_hash = await verify_and_update_password("testpassword", new_hash)
+    assert is_valid
+    assert new_hash is None
+
+    is_valid, _ = await verify_and_update_password("wrongpassword", outdated_hash)
+    assert not is_valid
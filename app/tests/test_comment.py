@@ -1,14 +1,23 @@
 import datetime
+import json
 import time
 from typing import Optional
 from datetime import datetime, timedelta
 
-from sqlalchemy import text
+import asyncio
+
+import pytest
+from sqlalchemy import func, select, text
 
 from .test_auth import user
 from .conftest import create_user, TestSecondUserCredentials
 
-from .conftest import override_get_db
+from .conftest import engine, AsyncTestingSessionLocal
+from ..models.comment import Comment as CommentModel
+from ..models.comment import ScheduledReply
+from ..services.comment_daily_stats import rebuild_comment_daily_stats
+from ..services.reply_scheduler import ReplyScheduler
+from ..core.config import settings
 
 # Create another user for testing
 user2 = TestSecondUserCredentials()
@@ -104,6 +113,18 @@ def test_create_comment_unauthenticated(create_test_db, test_client):
     assert response.status_code == 401
 
 
+def test_create_comment_post_not_found(create_test_db, test_client):
+    """Test the comment creation endpoint in case, where post doesn't exist."""
+    response = test_client.post(
+        "api/posts/999999/comments",
+        headers={"Authorization": user.access_token},
+        json={
+            "content": "Comment to nowhere"
+        }
+    )
+    assert response.status_code == 404
+
+
 def test_list_comments(create_test_db, test_client):
     """
     Test list comments endpoint.
@@ -119,8 +140,58 @@ def test_list_comments(create_test_db, test_client):
     data = response.json()
 
     # Verify retrieving of two previously created comments
-    assert len(data) == 2
-    assert data[0]["content"] == "I'm first!"
+    assert len(data["items"]) == 2
+    assert data["items"][0]["content"] == "I'm first!"
+    assert data["next_cursor"] is None
+    assert data["prev_cursor"] is None
+
+
+def test_list_comments_pagination(create_test_db, test_client):
+    """
+    Test list comments endpoint pagination.
+
+    This test ensures, that comments can be retrieved page by page in both directions, following cursors.
+    """
+    global POST_ID
+    first_page_response = test_client.get(f"api/posts/{POST_ID}/comments?limit=1")
+    assert first_page_response.status_code == 200
+
+    first_page_data = first_page_response.json()
+    assert first_page_data["items"][0]["content"] == "I'm first!"
+    assert first_page_data["next_cursor"] is not None
+    assert first_page_data["prev_cursor"] is None
+
+    # Go forward
+    second_page_response = test_client.get(
+        f"api/posts/{POST_ID}/comments?limit=1&after={first_page_data['next_cursor']}")
+    assert second_page_response.status_code == 200
+
+    second_page_data = second_page_response.json()
+    assert second_page_data["items"][0]["content"] == "those damn bots are always first"
+    assert second_page_data["next_cursor"] is None
+    assert second_page_data["prev_cursor"] is not None
+
+    # Go back
+    previous_page_response = test_client.get(
+        f"api/posts/{POST_ID}/comments?limit=1&before={second_page_data['prev_cursor']}")
+    assert previous_page_response.status_code == 200
+
+    previous_page_data = previous_page_response.json()
+    assert previous_page_data["items"] == first_page_data["items"]
+    assert previous_page_data["next_cursor"] is not None
+    assert previous_page_data["prev_cursor"] is None
+
+    # Verify, that both cursors cannot be provided at once
+    both_cursors_response = test_client.get(
+        f"api/posts/{POST_ID}/comments?after={first_page_data['next_cursor']}&before={second_page_data['prev_cursor']}")
+    assert both_cursors_response.status_code == 400
+
+
+def test_list_comments_query_budget(create_test_db, test_client, query_budget):
+    """Test, that comments page is read with at most two statements: post version and the page itself"""
+    with query_budget(2):
+        for _ in range(3):
+            assert test_client.get(f"api/posts/{POST_ID}/comments", params={"limit": 1}).status_code == 200
 
 
 def test_update_comment(create_test_db, test_client):
@@ -142,6 +213,30 @@ def test_update_comment(create_test_db, test_client):
     assert data["content"] == "Answer below, if you are bot yourself!"
 
 
+def test_list_comments_etag(create_test_db, test_client):
+    """
+    Test conditional requests for comments of post.
+
+    This test ensures, that request with current ETag is answered with 304, and that ETag changes after comment update.
+    """
+    comments_url = f"api/posts/{POST_ID}/comments"
+    etag = test_client.get(comments_url).headers["ETag"]
+
+    response = test_client.get(comments_url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    update_response = test_client.put(
+        f"{comments_url}/1",
+        json={"content": "Answer below, if you are bot yourself!"},
+        headers={"Authorization": user.access_token}
+    )
+    assert update_response.status_code == 200
+
+    response = test_client.get(comments_url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
 def test_update_comment_unauthenticated(create_test_db, test_client):
     """Test for update comment endpoint in case, where no credentials were provided"""
     global POST_ID
@@ -246,11 +341,103 @@ def test_comments_daily_breakdown(create_test_db, test_client):
     assert comments_for_days_out_range_response.json().get("total_comments_amount") == 0
 
 
+def test_comments_daily_breakdown_counts_only(create_test_db, test_client):
+    """
+    Test comment analytic endpoint without comment items.
+
+    This test ensures, that only amounts of comments are returned, when items are not requested,
+    and that amount of returned items is limited by items_per_day.
+    """
+    today_date = datetime.today().strftime("%Y-%m-%d")
+
+    counts_only_response = test_client.get(
+        f'api/comments-daily-breakdown?date_from={today_date}&date_to={today_date}&include_items=false')
+    assert counts_only_response.status_code == 200
+
+    counts_only_data = counts_only_response.json()
+    assert counts_only_data["comments"][today_date] == {"comments_amount": 4}
+    assert "items" not in counts_only_data["blocked_comments"][today_date]
+
+    # Verify blocked comment from test_create_harmful_comment is counted
+    assert counts_only_data["total_blocked_comments_amount"] == 1
+
+    capped_response = test_client.get(
+        f'api/comments-daily-breakdown?date_from={today_date}&date_to={today_date}&items_per_day=2')
+    assert capped_response.status_code == 200
+
+    capped_data = capped_response.json()
+    assert capped_data["comments"][today_date]["comments_amount"] == 4
+    assert [item["content"] for item in capped_data["comments"][today_date]["items"]] == [
+        "Comment number 1", "Comment number 2"
+    ]
+
+
+def test_comments_daily_breakdown_ndjson(create_test_db, test_client):
+    """
+    Test comment analytic endpoint with streamed NDJSON response.
+
+    This test ensures, that streamed lines contain the same days, comments and totals as JSON response.
+    """
+    today_date = datetime.today().strftime("%Y-%m-%d")
+    breakdown_url = f'api/comments-daily-breakdown?date_from={today_date}&date_to={today_date}'
+
+    json_data = test_client.get(breakdown_url).json()
+
+    ndjson_response = test_client.get(f'{breakdown_url}&format=ndjson')
+    assert ndjson_response.status_code == 200
+    assert ndjson_response.headers["content-type"] == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in ndjson_response.text.splitlines()]
+
+    # Verify day bucket goes first, followed by its comments
+    assert lines[0] == {"type": "day", "comments_type": "comments", "date": today_date, "comments_amount": 4}
+    assert [line["content"] for line in lines[1:5]] == [
+        item["content"] for item in json_data["comments"][today_date]["items"]
+    ]
+    assert all(line["type"] == "comment" and line["comments_type"] == "comments" for line in lines[1:5])
+
+    # Verify totals line
+    assert lines[-1] == {
+        "type": "total",
+        "total_comments_amount": json_data["total_comments_amount"],
+        "total_blocked_comments_amount": json_data["total_blocked_comments_amount"]
+    }
+
+    # Verify, that without items only day buckets are streamed
+    counts_only_lines = test_client.get(f'{breakdown_url}&format=ndjson&include_items=false').text.splitlines()
+    assert [json.loads(line)["type"] for line in counts_only_lines] == ["day", "day", "total"]
+
+
+def test_rebuild_comment_daily_stats(create_test_db, test_client):
+    """
+    Test rebuilding of comments daily rollup.
+
+    This test ensures, that rollup rebuilt from comments tables matches the one maintained by comment endpoints.
+    """
+    today_date = datetime.today().strftime("%Y-%m-%d")
+    breakdown_url = f'api/comments-daily-breakdown?date_from={today_date}&date_to={today_date}&include_items=false'
+
+    maintained_data = test_client.get(breakdown_url).json()
+
+    with engine.begin() as connection:
+        assert rebuild_comment_daily_stats(connection) > 0
+
+    rebuilt_data = test_client.get(breakdown_url).json()
+    assert rebuilt_data == maintained_data
+
+
 def test_auto_reply_feature(create_test_db, test_client):
     """Test for auto reply feature.
 
     This test ensures, that if user enabled this feature, comments will be generated and added to the database."""
 
+    # Run application lifespan, so reply scheduler publishes delayed replies
+    with test_client:
+        _check_auto_reply(test_client)
+
+
+def _check_auto_reply(test_client):
+
     # Enable auto-responding feature for user1
     enable_auto_response = test_client.patch(
         'api/user/',
@@ -292,4 +479,208 @@ def test_auto_reply_feature(create_test_db, test_client):
     )
     assert post_comments_response.status_code == 200
 
-    assert len(post_comments_response.json()) == 2
+    assert len(post_comments_response.json()["items"]) == 2
+
+
+class FakeReplyService:
+    """Reply service, that generates reply without LLM call"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = 0
+
+    async def get_reply_string(self, post_content: str, comment_to_reply_content: str) -> str:
+        self.calls += 1
+        # Let other workers try to generate the same reply meanwhile
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("LLM is down")
+        return f"Reply to {comment_to_reply_content}"
+
+
+@pytest.mark.asyncio
+async def test_reply_scheduler_resumes_pending_replies(create_test_db, test_client):
+    """
+    Test delayed replies durability.
+
+    This test ensures, that replies saved while scheduler wasn't running, both generated and not generated yet,
+    are published once scheduler starts.
+    """
+    async with AsyncTestingSessionLocal() as db:
+        comment = await db.scalar(select(CommentModel).filter(CommentModel.post_id == POST_ID))
+        db.add(ScheduledReply(content="Generated reply", due_at=datetime.now(),
+                              author_id=user.user_id, post_id=POST_ID))
+        await db.commit()
+
+        scheduler = ReplyScheduler(AsyncTestingSessionLocal, reply_service=FakeReplyService())
+        scheduler.schedule(db, comment_id=comment.id, delay_min=0, author_id=user.user_id, post_id=POST_ID)
+        await db.commit()
+
+    expected_contents = ["Generated reply", f"Reply to {comment.content}"]
+    await scheduler.start()
+    try:
+        for _ in range(50):
+            async with AsyncTestingSessionLocal() as db:
+                published = await db.scalar(select(func.count())
+                                            .select_from(CommentModel)
+                                            .filter(CommentModel.content.in_(expected_contents)))
+                pending = await db.scalar(select(func.count()).select_from(ScheduledReply))
+            if published == 2:
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        await scheduler.stop()
+
+    assert published == 2
+    assert pending == 0
+
+
+
+@pytest.mark.asyncio
+async def test_reply_scheduler_claims_replies(create_test_db, test_client):
+    """
+    Test generation of replies by several workers.
+
+    This test ensures, that reply loaded by every worker on start is generated by one of them only.
+    """
+    async with AsyncTestingSessionLocal() as db:
+        comment = await db.scalar(select(CommentModel).filter(CommentModel.post_id == POST_ID))
+        reply_service = FakeReplyService()
+        schedulers = [ReplyScheduler(AsyncTestingSessionLocal, reply_service=reply_service) for _ in range(3)]
+        scheduled_reply = schedulers[0].schedule(db, comment_id=comment.id, delay_min=60,
+                                                 author_id=user.user_id, post_id=POST_ID)
+        await db.commit()
+        reply_id = scheduled_reply.id
+
+    for scheduler in schedulers:
+        await scheduler.start()
+    try:
+        for _ in range(50):
+            async with AsyncTestingSessionLocal() as db:
+                reply = await db.get(ScheduledReply, reply_id)
+            if reply.content is not None:
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        for scheduler in schedulers:
+            await scheduler.stop()
+
+    assert reply.content == f"Reply to {comment.content}"
+    assert reply.claimed_at is None
+    assert reply_service.calls == 1
+
+    async with AsyncTestingSessionLocal() as db:
+        await db.delete(await db.get(ScheduledReply, reply_id))
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_reply_scheduler_gives_up_failed_replies(create_test_db, test_client):
+    """
+    Test failed generation of reply.
+
+    This test ensures, that failed generation is retried, and after the last attempt reply is marked as failed
+    and isn't generated again on the next start.
+    """
+    async with AsyncTestingSessionLocal() as db:
+        comment = await db.scalar(select(CommentModel).filter(CommentModel.post_id == POST_ID))
+        reply_service = FakeReplyService(fail=True)
+        scheduler = ReplyScheduler(AsyncTestingSessionLocal, reply_service=reply_service,
+                                   retry_delay=0.01, max_attempts=3)
+        scheduled_reply = scheduler.schedule(db, comment_id=comment.id, delay_min=0,
+                                             author_id=user.user_id, post_id=POST_ID)
+        await db.commit()
+        reply_id = scheduled_reply.id
+
+    await scheduler.start()
+    try:
+        for _ in range(50):
+            async with AsyncTestingSessionLocal() as db:
+                reply = await db.get(ScheduledReply, reply_id)
+            if reply.failed_at is not None:
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        await scheduler.stop()
+
+    assert reply.failed_at is not None
+    assert reply.attempts == 3
+    assert reply_service.calls == 3
+
+    await scheduler.start()
+    await asyncio.sleep(0.2)
+    await scheduler.stop()
+    assert reply_service.calls == 3
+
+    async with AsyncTestingSessionLocal() as db:
+        await db.delete(await db.get(ScheduledReply, reply_id))
+        await db.commit()
+
+def test_create_comments_batch(create_test_db, test_client):
+    """
+    Test bulk comments creation endpoint.
+
+    This test ensures, that accepted and flagged comments of one batch are saved to comments and blocked comments,
+    that result of every item is returned in request order, and that auto-replies are scheduled for accepted ones.
+    """
+    create_post_response = test_client.post(
+        'api/posts/',
+        headers={"Authorization": user.access_token},
+        json={
+            "title": "Batch",
+            "content": "Post for bulk comments"
+        }
+    )
+    post_id = create_post_response.json()["id"]
+
+    response = test_client.post(
+        f"api/posts/{post_id}/comments:batch",
+        headers={"Authorization": user2.access_token},
+        json={"comments": [{"content": "Nice post"},
+                           {"content": "I wish you get hit by a truck"},
+                           {"content": "Nice post"}]}
+    )
+    assert response.status_code == 201
+
+    data = response.json()
+    assert data["created"] == 2
+    assert data["blocked"] == 1
+    assert [item["status"] for item in data["items"]] == ["created", "blocked", "created"]
+    assert [item["index"] for item in data["items"]] == [0, 1, 2]
+    assert data["items"][1]["comment"]["blocking_reasoning"]
+    assert all(item["comment"]["post_id"] == post_id for item in data["items"])
+
+    comments = test_client.get(f"api/posts/{post_id}/comments").json()["items"]
+    assert [comment["id"] for comment in comments] == [data["items"][0]["comment"]["id"],
+                                                       data["items"][2]["comment"]["id"]]
+
+    # Post author has auto-reply enabled by previous tests, so every accepted comment gets a reply
+    with engine.connect() as connection:
+        scheduled = connection.execute(
+            select(func.count()).select_from(ScheduledReply).filter(ScheduledReply.post_id == post_id)
+        ).scalar()
+    assert scheduled == 2
+
+
+def test_create_comments_batch_invalid(create_test_db, test_client):
+    """Test bulk comments creation endpoint with missing post, empty and oversized batches."""
+    response = test_client.post(
+        "api/posts/999999/comments:batch",
+        headers={"Authorization": user2.access_token},
+        json={"comments": [{"content": "Comment to nowhere"}]}
+    )
+    assert response.status_code == 404
+
+    response = test_client.post(
+        f"api/posts/{POST_ID}/comments:batch",
+        headers={"Authorization": user2.access_token},
+        json={"comments": []}
+    )
+    assert response.status_code == 422
+
+    response = test_client.post(
+        f"api/posts/{POST_ID}/comments:batch",
+        headers={"Authorization": user2.access_token},
+        json={"comments": [{"content": "Spam"}] * (settings.COMMENT_BATCH_MAX_SIZE + 1)}
+    )
+    assert response.status_code == 422
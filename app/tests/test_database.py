@@ -0,0 +1,194 @@
+import asyncio
+import json
+from datetime import datetime
+
+import httpx
+from sqlalchemy import create_engine, func, select, text
+
+from ..cli import data_transfer
+from ..cli.data_transfer import TABLES, export_table, import_table
+from ..core.query_stats import QueryStatsMiddleware, collect_queries
+from ..database import get_storage_profile, STORAGE_PROFILES, Base
+from ..core.config import settings
+from ..models import User, Post, Comment, BlockedComment
+from ..main import app
+from ..services.llm_moderation import moderation_service
+from ..services.post_versions import post_versions
+from .conftest import engine, TestingSessionLocal
+
+
+def test_storage_profile_pragmas(create_test_db):
+    """
+    Test SQLite storage profile.
+
+    This test ensures, that PRAGMAs of configured storage profile are applied to every new connection.
+    """
+    profile = get_storage_profile()
+
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar().upper() == profile["journal_mode"].upper()
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == profile["busy_timeout"]
+        assert connection.execute(text("PRAGMA cache_size")).scalar() == profile["cache_size"]
+
+
+def test_storage_profile_overrides(monkeypatch):
+    """Test, that individual SQLITE_* settings override values of the storage profile"""
+    monkeypatch.setattr(settings, "STORAGE_PROFILE", "legacy")
+    monkeypatch.setattr(settings, "SQLITE_BUSY_TIMEOUT", 1234)
+
+    profile = get_storage_profile()
+
+    assert profile["journal_mode"] == STORAGE_PROFILES["legacy"]["journal_mode"]
+    assert profile["busy_timeout"] == 1234
+
+
+def test_data_transfer_round_trip(create_test_db, tmp_path, monkeypatch):
+    """
+    Test JSONL export and import of tables.
+
+    This test ensures, that exported rows are imported into empty database unchanged, that import can be resumed
+    skipping existing rows, and that flagged comments go to blocked comments when moderation is enabled, without
+    conflicting with exported blocked comments.
+    """
+    created_at = datetime(2024, 7, 20, 17, 46, 52)
+    with TestingSessionLocal() as db:
+        db.add(User(id=1, username="transfer", email="transfer@example.com", hashed_password="-"))
+        db.add(Post(id=1, title="title", content="content", owner_id=1))
+        db.add_all([Comment(id=i, content=f"comment {i}", created_at=created_at, owner_id=1, post_id=1)
+                    for i in range(1, 6)])
+        db.add(Comment(id=6, content="bad comment", created_at=created_at, owner_id=1, post_id=1))
+        db.add(BlockedComment(id=1, content="blocked before", created_at=created_at, owner_id=1, post_id=1,
+                              blocking_reasoning="violence"))
+        db.commit()
+
+    table_names = ("users", "posts", "blocked_comments", "comments")
+    files = {}
+    for table_name in table_names:
+        with open(tmp_path / f"{table_name}.jsonl", "w") as file:
+            assert export_table(engine, TABLES[table_name], file, chunk_size=2) > 0
+        files[table_name] = tmp_path / f"{table_name}.jsonl"
+    assert len(files["comments"].read_text().splitlines()) == 6
+
+    target_engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    Base.metadata.create_all(target_engine)
+
+    moderated, loops = [], set()
+
+    async def moderate_contents(contents: list[str]) -> list[dict]:
+        moderated.extend(contents)
+        loops.add(id(asyncio.get_running_loop()))
+        return [{"flagged": "bad" in content, "categories": {"harassment": "bad" in content}} for content in contents]
+
+    monkeypatch.setattr(moderation_service, "moderate_contents", moderate_contents)
+
+    # Tables are imported in order of TABLES
+    assert [table_name for table_name in TABLES if table_name in table_names] == list(table_names)
+    for table_name in table_names:
+        with open(files[table_name]) as file:
+            import_table(target_engine, TABLES[table_name], file, chunk_size=4, moderate=True)
+
+    with target_engine.connect() as connection:
+        comments = connection.execute(select(Comment.id, Comment.content, Comment.created_at)
+                                      .order_by(Comment.id)).all()
+        blocked = connection.execute(select(BlockedComment.id, BlockedComment.content,
+                                            BlockedComment.blocking_reasoning).order_by(BlockedComment.id)).all()
+    assert comments == [(i, f"comment {i}", created_at) for i in range(1, 6)]
+    # Exported blocked comment keeps its id, and comment, flagged on import, gets the next one
+    assert blocked == [(1, "blocked before", "violence"), (2, "bad comment", "harassment")]
+    # Both chunks are moderated on one event loop
+    assert len(moderated) == 6 and len(loops) == 1
+
+    # Resumed import skips rows, that are already there, including flagged comment moved to blocked comments,
+    # with and without moderation, and doesn't moderate them again
+    for moderate in (False, True):
+        for table_name in ("blocked_comments", "comments"):
+            with open(files[table_name]) as file:
+                import_table(target_engine, TABLES[table_name], file, chunk_size=4,
+                             moderate=moderate, skip_existing=True)
+    assert len(moderated) == 6
+
+    with target_engine.connect() as connection:
+        assert connection.execute(select(Comment.id, Comment.content, Comment.created_at)
+                                  .order_by(Comment.id)).all() == comments
+        assert connection.execute(select(BlockedComment.id, BlockedComment.content, BlockedComment.blocking_reasoning)
+                                  .order_by(BlockedComment.id)).all() == blocked
+    target_engine.dispose()
+
+
+def test_data_transfer_moderation_retries(create_test_db, tmp_path, monkeypatch):
+    """Test, that moderation call of import, failed with rate limit, is retried"""
+    created_at = datetime(2024, 7, 20, 17, 46, 52)
+    path = tmp_path / "comments.jsonl"
+    path.write_text("".join(json.dumps({"id": i, "content": f"comment {i}", "created_at": created_at.isoformat(),
+                                        "owner_id": 1, "post_id": 1}) + "\n" for i in range(1, 4)))
+
+    target_engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    Base.metadata.create_all(target_engine)
+
+    calls = []
+
+    async def moderate_contents(contents: list[str]) -> list[dict]:
+        calls.append(contents)
+        if len(calls) == 1:
+            request = httpx.Request("POST", "http://moderation.test/v1/moderations")
+            response = httpx.Response(429, headers={"Retry-After": "0"}, request=request)
+            raise httpx.HTTPStatusError("Too Many Requests", request=request, response=response)
+        return [{"flagged": False} for _ in contents]
+
+    monkeypatch.setattr(moderation_service, "moderate_contents", moderate_contents)
+    monkeypatch.setattr(data_transfer, "MODERATION_RETRY_DELAY", 0.01)
+
+    with open(path) as file:
+        assert import_table(target_engine, TABLES["comments"], file, chunk_size=10, moderate=True) == 3
+    assert len(calls) == 2
+
+    with target_engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(Comment)).scalar() == 3
+    target_engine.dispose()
+
+
+def test_query_stats(create_test_db, caplog, monkeypatch):
+    """
+    Test database statements instrumentation.
+
+    This test ensures, that statements are counted with shapes, where lists of values are collapsed, that repeated
+    shapes are reported as N+1 queries, and that slow statements are logged without values of parameters.
+    """
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(settings, "N_PLUS_ONE_THRESHOLD", 3)
+
+    with collect_queries() as stats:
+        with engine.connect() as connection:
+            for user_id in range(3):
+                connection.execute(select(User.id).filter(User.id == user_id, User.username != "secret-value"))
+            connection.execute(select(User.id).filter(User.id.in_([1, 2, 3])))
+            connection.execute(select(User.id).filter(User.id.in_([4, 5])))
+
+    assert stats.count == 5
+    assert stats.duration > 0
+    assert sorted(stats.shapes.values()) == [2, 3]
+    assert "secret-value" not in caplog.text
+    assert "Slow query" in caplog.text and "<str>" in caplog.text
+
+    caplog.clear()
+    QueryStatsMiddleware._finish({"type": "http", "method": "GET", "route_template": "/test"}, stats)
+    assert "Probable N+1 query in GET /test: statement executed 3 times" in caplog.text
+
+
+def test_startup_warm_up(create_test_db, test_client):
+    """
+    Test startup warm-up.
+
+    This test ensures, that application lifespan reports time of warm-up steps, and that versions of the newest posts
+    are cached before the first request.
+    """
+    with TestingSessionLocal() as db:
+        db.add(User(id=901, username="warmup", email="warmup@example.com", hashed_password="x"))
+        db.add_all([Post(id=post_id, title="Warm-up", content="Warm-up", owner_id=901) for post_id in (901, 902)])
+        db.commit()
+    post_versions.clear()
+
+    with test_client:
+        assert set(app.state.startup_timings) == {"pool", "openapi", "caches", "total"}
+        assert post_versions.stats()["versions"]["size"] >= 2
+        assert app.openapi_schema is not None
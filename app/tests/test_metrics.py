@@ -0,0 +1,85 @@
+import httpx
+import pytest
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.parser import text_string_to_metric_families
+
+from ..core.metrics import REGISTRY, CacheCollector
+from ..services.llm_moderation import ModerationService
+
+
+def test_cache_collector():
+    """
+    Test metrics of caches, read from their stats on scrape.
+
+    This test ensures, that every stat is exported with cache label, and counters get _total suffix.
+    """
+    registry = CollectorRegistry()
+    collector = CacheCollector()
+    registry.register(collector)
+    stats = {"size": 2, "hits": 3, "misses": 1, "evictions": 0, "hit_rate": 0.75}
+    collector.add("test", lambda: stats)
+
+    assert registry.get_sample_value("cache_entries", {"cache": "test"}) == 2
+    assert registry.get_sample_value("cache_hits_total", {"cache": "test"}) == 3
+    assert registry.get_sample_value("cache_misses_total", {"cache": "test"}) == 1
+    assert registry.get_sample_value("cache_hit_ratio", {"cache": "test"}) == 0.75
+
+    # Values are read again on every scrape
+    stats["hits"] = 4
+    assert registry.get_sample_value("cache_hits_total", {"cache": "test"}) == 4
+
+
+def test_metrics_endpoint(create_test_db, test_client):
+    """
+    Test metrics endpoint.
+
+    This test ensures, that requests are labelled by route template instead of raw path, and that cache metrics
+    are exported.
+    """
+    test_client.get("api/posts/123456")
+    test_client.get("api/no-such-path/123456")
+
+    response = test_client.get("metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/posts/{post_id}",status="404"}' in body
+    assert 'route="unmatched"' in body
+    assert "123456" not in body
+    assert REGISTRY.get_sample_value("http_request_duration_seconds_bucket",
+                                     {"method": "GET", "route": "/api/posts/{post_id}", "le": "+Inf"}) >= 1
+    assert 'cache_hits_total{cache="users"}' in body
+    assert 'cache_hit_ratio{cache="users"}' in body
+    assert "password_hash_in_progress" in body
+    # Body is valid Prometheus text format
+    assert "http_request_duration_seconds" in {family.name for family in text_string_to_metric_families(body)}
+
+
+def _outbound_calls(status: int | str) -> float:
+    return REGISTRY.get_sample_value("outbound_requests_total", {"service": "moderation", "status": str(status)}) or 0
+
+
+@pytest.mark.asyncio
+async def test_outbound_call_metrics():
+    """Test, that outbound moderation calls are counted with status code of response, or error without response"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(429, json={})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+        service = ModerationService(api_key="test", http_client=http_client, api_base_url="http://moderation.test/v1")
+        before = _outbound_calls(429)
+        with pytest.raises(httpx.HTTPStatusError):
+            await service.moderate_content("content")
+        assert _outbound_calls(429) == before + 1
+
+    def failing_handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Connection refused")
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(failing_handler)) as http_client:
+        service = ModerationService(api_key="test", http_client=http_client, api_base_url="http://moderation.test/v1")
+        before = _outbound_calls("error")
+        with pytest.raises(httpx.ConnectError):
+            await service.moderate_content("content")
+        assert _outbound_calls("error") == before + 1
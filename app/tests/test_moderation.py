@@ -1,6 +1,14 @@
+import asyncio
+import json
+
+import httpx
 import pytest
 
-from ..services.llm_moderation import moderation_service
+from ..core.cache import TTLCache
+from ..services.llm_moderation import moderation_service, ModerationBatcher, ModerationService
+from ..services.moderation_cache import (content_hash, ModerationCache, InMemoryModerationCacheBackend,
+                                         SQLiteModerationCacheBackend)
+from .conftest import AsyncTestingSessionLocal
 
 
 @pytest.mark.asyncio
@@ -18,3 +26,194 @@ async def test_moderate_content_service():
 
     harmful_response = await moderation_service.moderate_content(harmful_content)
     assert harmful_response["flagged"]
+
+
+def test_moderation_cache_content_hash():
+    """Test, that content differing only in case and whitespace shares moderation cache key"""
+    assert content_hash("Thanks!") == content_hash("  thanks!\n")
+    assert content_hash("Great  post") == content_hash("great post")
+    assert content_hash("thanks!") != content_hash("thanks?")
+
+
+def test_ttl_cache_eviction():
+    """Test in-process cache expiration, least recently used eviction and counters"""
+    now = [0.0]
+    cache = TTLCache(max_size=2, ttl=10, timer=lambda: now[0])
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is least recently used, so it is evicted
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    # Entries expire after ttl
+    now[0] = 11
+    assert cache.get("a") is None
+
+    assert cache.stats() == {"size": 1, "max_size": 2, "hits": 2, "misses": 2, "evictions": 1, "hit_rate": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_moderate_content_cache_hit():
+    """
+    Test moderation service with results cache.
+
+    This test ensures, that cached verdict is returned for the same normalized content without remote call.
+    """
+    cached_result = {"flagged": False, "categories": {}}
+    service = ModerationService(api_key="invalid",
+                                cache=ModerationCache(InMemoryModerationCacheBackend(max_size=10, ttl=60)))
+    # Remote call to this url would fail
+    service.base_url = "http://127.0.0.1:9/v1/moderations"
+
+    await service.cache.set("thanks!", cached_result)
+
+    assert await service.moderate_content("Thanks!") == cached_result
+    assert service.cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_moderation_cache_backend(create_test_db):
+    """
+    Test moderation cache backend, shared by workers through database.
+
+    This test ensures, that results are stored in database, expire, and least recently used ones are pruned.
+    """
+    backend = SQLiteModerationCacheBackend(AsyncTestingSessionLocal, max_size=2, ttl=60, prune_every=1)
+
+    await backend.set("a", {"flagged": False})
+    assert await backend.get("a") == {"flagged": False}
+    assert await backend.get("missing") is None
+
+    # Adding entries above max size prunes least recently used ones
+    await backend.set("b", {"flagged": True})
+    await backend.set("c", {"flagged": False})
+    assert await backend.get("a") is None
+    assert await backend.get("c") == {"flagged": False}
+    assert backend.evictions == 1
+
+    # Expired entries are not returned
+    backend.ttl = -1
+    await backend.set("d", {"flagged": False})
+    assert await backend.get("d") is None
+
+
+@pytest.mark.asyncio
+async def test_moderation_batcher():
+    """
+    Test coalescing of concurrent moderation calls.
+
+    This test ensures, that concurrent contents are sent in batches of limited size, identical contents are sent once,
+    and every caller gets result for its own content.
+    """
+    sent_batches = []
+
+    async def send_batch(contents):
+        sent_batches.append(contents)
+        return [{"flagged": content == "bad"} for content in contents]
+
+    batcher = ModerationBatcher(send_batch, max_batch_size=3, max_wait_ms=50)
+    results = await asyncio.gather(*(batcher.submit(content) for content in ["good", "bad", "good", "nice", "bad"]))
+
+    assert [result["flagged"] for result in results] == [False, True, False, False, True]
+    # Batch is sent as soon as it has 3 distinct contents, the rest waits for the timer
+    assert sent_batches == [["good", "bad", "nice"], ["bad"]]
+
+
+@pytest.mark.asyncio
+async def test_moderation_batcher_error():
+    """Test, that failure of batched call is raised to every caller of the batch"""
+    async def send_batch(contents):
+        raise RuntimeError("Moderation API is down")
+
+    batcher = ModerationBatcher(send_batch, max_batch_size=10, max_wait_ms=1)
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_moderation_batcher_malformed_response():
+    """Test, that every caller gets an error, if batched call returns no results"""
+    async def send_batch(contents):
+        return None
+
+    batcher = ModerationBatcher(send_batch, max_batch_size=10, max_wait_ms=1)
+    results = await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b"),
+                                                    return_exceptions=True), timeout=2)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_moderation_batcher_short_response():
+    """Test, that every caller gets an error, if batched call returns less results than contents"""
+    async def send_batch(contents):
+        return [{"flagged": False}]
+
+    batcher = ModerationBatcher(send_batch, max_batch_size=10, max_wait_ms=1)
+    results = await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b"), batcher.submit("a"),
+                                                    return_exceptions=True), timeout=2)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_moderate_content_shared_http_client():
+    """
+    Test moderation service with shared HTTP client.
+
+    This test ensures, that calls go through injected client, and the client stays open for next calls.
+    """
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"results": [{"flagged": False}]})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+        service = ModerationService(api_key="test", http_client=http_client)
+        service.base_url = "http://moderation.test/v1/moderations"
+
+        assert await service.moderate_content("first") == {"flagged": False}
+        assert await service.moderate_content("second") == {"flagged": False}
+        assert len(requests) == 2
+        assert not http_client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_moderate_contents():
+    """
+    Test moderation of several contents at once.
+
+    This test ensures, that cached verdicts are reused, and the rest of distinct contents are sent with single call.
+    """
+    inputs = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        contents = json.loads(request.content)["input"]
+        inputs.append(contents)
+        return httpx.Response(200, json={"results": [{"flagged": content == "bad"} for content in contents]})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+        cache = ModerationCache(InMemoryModerationCacheBackend(max_size=10, ttl=60))
+        service = ModerationService(api_key="test", cache=cache, http_client=http_client, max_batch_size=10)
+        service.base_url = "http://moderation.test/v1/moderations"
+        await cache.set("cached", {"flagged": False})
+
+        results = await service.moderate_contents(["good", "bad", "cached", "good"])
+        assert [result["flagged"] for result in results] == [False, True, False, False]
+        assert inputs == [["good", "bad"]]
+
+        # Verdicts of sent contents are cached too
+        await service.moderate_contents(["bad", "good"])
+        assert len(inputs) == 1
+
+        # Distinct contents above batch size are sent in several calls
+        service.max_batch_size = 2
+        results = await service.moderate_contents(["a", "bad", "c", "a", "d"])
+        assert [result["flagged"] for result in results] == [False, True, False, False, False]
+        assert inputs[1:] == [["a", "c"], ["d"]]
@@ -1,4 +1,12 @@
+import asyncio
+
+import pytest
+
 from .test_auth import user
+from ..core.cache import ByteLRUCache
+from ..core.config import settings
+from ..core.pagination import encode_cursor
+from ..services.post_versions import PostVersions, post_versions
 from .conftest import create_user, TestSecondUserCredentials
 
 # Create another user for testing
@@ -75,8 +83,37 @@ def test_list_posts(create_test_db, test_client):
     data = response.json()
 
     # Verify retrieving of two previously created posts
-    assert len(data) == 2
-    assert data[0]["content"] == "test content"
+    assert len(data["items"]) == 2
+    assert data["items"][0]["content"] == "test content"
+    assert data["next_cursor"] is None
+
+
+def test_list_posts_pagination(create_test_db, test_client):
+    """
+    Test list posts endpoint pagination.
+
+    This test ensures, that posts can be retrieved page by page, following next_cursor.
+    """
+    first_page_response = test_client.get("api/posts?limit=1")
+    assert first_page_response.status_code == 200
+
+    first_page_data = first_page_response.json()
+    assert len(first_page_data["items"]) == 1
+    assert first_page_data["next_cursor"] is not None
+
+    second_page_response = test_client.get(f"api/posts?limit=1&cursor={first_page_data['next_cursor']}")
+    assert second_page_response.status_code == 200
+
+    second_page_data = second_page_response.json()
+    assert len(second_page_data["items"]) == 1
+    assert second_page_data["items"][0]["id"] > first_page_data["items"][0]["id"]
+    assert second_page_data["next_cursor"] is None
+
+    # Verify page size limit and cursor validation
+    assert test_client.get("api/posts?limit=100000").status_code == 422
+    assert test_client.get("api/posts?cursor=not-a-cursor").status_code == 400
+    for forged_id in ([1], None, {}, "abc"):
+        assert test_client.get("api/posts", params={"cursor": encode_cursor({"id": forged_id})}).status_code == 400
 
 
 def test_get_post(create_test_db, test_client):
@@ -114,6 +151,142 @@ def test_update_post(create_test_db, test_client):
     assert data["content"] == "updated content"
 
 
+def test_get_post_etag(create_test_db, test_client):
+    """
+    Test conditional requests for post.
+
+    This test ensures, that request with current ETag is answered with 304, and that ETag changes after post update.
+    """
+    etag = test_client.get("api/posts/1").headers["ETag"]
+    assert etag.startswith("W/")
+
+    response = test_client.get("api/posts/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    update_response = test_client.put(
+        "api/posts/1",
+        json={"title": "test title", "content": "updated content"},
+        headers={"Authorization": user.access_token}
+    )
+    assert update_response.status_code == 200
+
+    response = test_client.get("api/posts/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_get_post_response_cache(create_test_db, test_client):
+    """
+    Test cache of serialized post responses.
+
+    This test ensures, that repeated requests are served from cache, and that post update invalidates cached response.
+    """
+    first_response = test_client.get("api/posts/1")
+    hits = post_versions.responses.hits
+    second_response = test_client.get("api/posts/1")
+    assert post_versions.responses.hits == hits + 1
+    assert second_response.content == first_response.content
+
+    update_response = test_client.put(
+        "api/posts/1",
+        json={"title": "test title", "content": "cached content"},
+        headers={"Authorization": user.access_token}
+    )
+    assert update_response.status_code == 200
+    assert test_client.get("api/posts/1").json()["content"] == "cached content"
+
+
+def test_get_deleted_post_with_cached_version(create_test_db, test_client):
+    """Test, that post with version, cached before it was deleted by another worker, is not found"""
+    post_versions._cache.set(9999, 1)
+    assert test_client.get("api/posts/9999").status_code == 404
+    # Stale version is dropped
+    assert post_versions._cache.get(9999) is None
+
+
+def test_post_query_budget(create_test_db, test_client, query_budget, monkeypatch):
+    """
+    Test amount of database statements of posts endpoints.
+
+    This test ensures, that posts page is read with one statement, post with cached version and response needs none,
+    and that database time is reported in Server-Timing header.
+    """
+    monkeypatch.setattr(settings, "QUERY_STATS_SERVER_TIMING", True)
+    test_client.get("api/posts/1")
+
+    with query_budget(1) as finished:
+        list_response = test_client.get("api/posts")
+        test_client.get("api/posts", params={"limit": 1})
+    assert len(finished) == 2
+    assert list_response.headers["Server-Timing"].startswith("db;dur=")
+    assert 'desc="1 queries"' in list_response.headers["Server-Timing"]
+
+    with query_budget(0):
+        assert test_client.get("api/posts/1").status_code == 200
+
+    # Header is opt-in, as it exposes database time to clients
+    monkeypatch.setattr(settings, "QUERY_STATS_SERVER_TIMING", False)
+    with query_budget(1):
+        assert "Server-Timing" not in test_client.get("api/posts").headers
+
+
+def test_byte_lru_cache():
+    """Test eviction by total size in bytes, group invalidation and counters of responses cache"""
+    cache = ByteLRUCache(max_bytes=10)
+
+    cache.set("a", b"1234", group=1)
+    cache.set("b", b"5678", group=2)
+    assert cache.get("a") == b"1234"
+
+    # "b" is least recently used, so it is evicted to fit "c"
+    cache.set("c", b"9012", group=1)
+    assert cache.get("b") is None
+    assert cache.size_bytes == 8
+
+    # Value larger than the whole cache is not stored
+    cache.set("d", b"12345678901")
+    assert cache.get("d") is None
+
+    assert cache.invalidate_group(1) == 2
+    assert cache.size_bytes == 0
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_post_version_invalidated_while_loading():
+    """
+    Test post versions cache.
+
+    This test ensures, that version loaded from database before concurrent invalidation is not cached, so the old
+    version isn't served after the change is committed.
+    """
+    loading = asyncio.Event()
+    invalidated = asyncio.Event()
+
+    class Session:
+        queries = 0
+
+        async def scalar(self, statement):
+            self.queries += 1
+            if self.queries == 1:
+                loading.set()
+                await invalidated.wait()
+            return self.queries
+
+    versions = PostVersions(max_size=10, ttl=60, responses_max_bytes=0)
+    db = Session()
+    load = asyncio.create_task(versions.get(db, 1))
+    await loading.wait()
+    versions.invalidate(1)
+    invalidated.set()
+
+    assert await load == 1
+    assert await versions.get(db, 1) == 2
+    assert await versions.get(db, 1) == 2
+    assert db.queries == 2
+
+
 def test_update_post_unauthenticated(create_test_db, test_client):
     """Test for update post endpoint in case, where no credentials were provided"""
     response = test_client.put(
@@ -0,0 +1,95 @@
+import asyncio
+import marshal
+import os
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from ..core.config import settings
+from ..core.profiling import ProfileStore, ProfilingMiddleware
+
+
+def build_app(store: ProfileStore | None = None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/slow/{item_id}")
+    async def slow(item_id: int):
+        await asyncio.sleep(0.03)
+        return {"id": item_id, "squares": [i * i for i in range(20000)][-1]}
+
+    app.add_middleware(ProfilingMiddleware, store=store)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_profile_on_demand(monkeypatch):
+    """
+    Test on-demand profiling.
+
+    This test ensures, that request is profiled only with valid token, and that profile is returned in requested
+    format instead of response, with status of response in header.
+    """
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/slow/1", headers={"X-Profile": "wrong"})
+        assert response.json()["id"] == 1
+
+        response = await client.get("/slow/1", headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        assert response.headers["x-profile-status"] == "200"
+        assert "cumulative" in response.text
+        assert "slow" in response.text
+
+        response = await client.get("/slow/1", headers={"X-Profile": "secret", "X-Profile-Format": "pstats"})
+        stats = marshal.loads(response.content)
+        assert any(function == "slow" for _, _, function in stats)
+
+        response = await client.get("/slow/1", headers={"X-Profile": "secret", "X-Profile-Format": "collapsed"})
+        lines = response.text.splitlines()
+        assert lines
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        # Request task was waiting in sleep most of the time
+        assert any("test_profiling.py:slow" in line and "<waiting>" in line for line in lines)
+
+        response = await client.get("/slow/1", headers={"X-Profile": "secret", "X-Profile-Format": "svg"})
+        assert response.status_code == 400
+
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/slow/1", headers={"X-Profile": ""})
+        assert response.json()["id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_profile_store(monkeypatch, tmp_path):
+    """
+    Test sampled profiling.
+
+    This test ensures, that only profiles of the slowest sampled requests are kept on disk, and that store is
+    restored from its directory.
+    """
+    store = ProfileStore(str(tmp_path), max_profiles=2)
+    assert store.save(0.2, "GET", "/api/a", "a 1\n") is not None
+    assert store.save(0.1, "GET", "/api/b", "b 1\n") is not None
+    assert store.save(0.3, "GET", "/api/c", "c 1\n") is not None
+    assert store.save(0.05, "GET", "/api/d", "d 1\n") is None
+
+    names = store.list()
+    assert sorted(os.listdir(tmp_path)) == sorted(names)
+    assert names[0].startswith("00000300ms-") and names[0].endswith("GET-api_c.collapsed")
+    assert names[1].startswith("00000200ms-")
+    assert ProfileStore(str(tmp_path), max_profiles=2).list() == names
+
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 1.0)
+    sampled_store = ProfileStore(str(tmp_path / "sampled"), max_profiles=1)
+    transport = httpx.ASGITransport(app=build_app(sampled_store))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/slow/2")
+        assert response.json()["id"] == 2
+
+    [name] = sampled_store.list()
+    assert name.endswith("GET-slow_item_id.collapsed")
+    with open(tmp_path / "sampled" / name) as file:
+        assert "<waiting>" in file.read()
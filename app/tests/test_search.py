@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from .test_auth import user
+from .conftest import create_user, TestingSessionLocal
+from ..core.pagination import encode_cursor
+from ..models import Comment
+
+
+def test_search(create_test_db, test_client):
+    """
+    Test the search endpoint.
+
+    This test ensures, that posts and comments are found by all query words, ordered by relevance and have snippets.
+    """
+    create_user(user)
+
+    post_ids = []
+    for title, content in [("Sourdough baking", "Bread needs flour, water and salt"),
+                           ("Gardening", "Tomatoes like sun")]:
+        response = test_client.post("api/posts", json={"title": title, "content": content},
+                                    headers={"Authorization": user.access_token})
+        assert response.status_code == 201
+        post_ids.append(response.json()["id"])
+
+    with TestingSessionLocal() as db:
+        for content in ["I bake sourdough bread every week", "Bread again", "Nothing to see here"]:
+            db.add(Comment(content=content, created_at=datetime.now(), owner_id=user.user_id, post_id=post_ids[1]))
+        db.commit()
+
+    response = test_client.get("api/search", params={"q": "bread"})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert {(item["type"], item["post_id"]) for item in items} == {
+        ("post", post_ids[0]), ("comment", post_ids[1]), ("comment", post_ids[1])
+    }
+    # Results are ordered by relevance, and matched words are highlighted
+    assert [item["rank"] for item in items] == sorted(item["rank"] for item in items)
+    assert all("<mark>" in item["snippet"].lower() for item in items)
+
+    # All words must match, stemming is applied, and FTS5 syntax in query is treated as text
+    response = test_client.get("api/search", params={"q": "baking sourdough", "scope": "comments"})
+    assert [item["snippet"] for item in response.json()["items"]] == [
+        "I <mark>bake</mark> <mark>sourdough</mark> bread every week"
+    ]
+    assert test_client.get("api/search", params={"q": 'bread" OR "salt'}).status_code == 200
+    assert test_client.get("api/search", params={"q": "!!!"}).json() == {"items": [], "next_cursor": None}
+
+
+def test_search_pagination(create_test_db, test_client):
+    """Test, that pages of search results, retrieved by cursor, don't overlap and cover all results."""
+    first_page = test_client.get("api/search", params={"q": "bread", "limit": 2}).json()
+    assert len(first_page["items"]) == 2
+    assert first_page["next_cursor"] is not None
+
+    second_page = test_client.get("api/search", params={"q": "bread", "limit": 2,
+                                                        "cursor": first_page["next_cursor"]}).json()
+    assert len(second_page["items"]) == 1
+    assert second_page["next_cursor"] is None
+
+    all_items = test_client.get("api/search", params={"q": "bread"}).json()["items"]
+    assert first_page["items"] + second_page["items"] == all_items
+
+    assert test_client.get("api/search", params={"q": "bread", "cursor": "invalid"}).status_code == 400
+    for forged in ({"rank": [1], "type": "post", "id": 1}, {"rank": "nan", "type": "post", "id": 1},
+                   {"rank": -1.0, "type": "user", "id": 1}, {"rank": -1.0, "type": "post", "id": None}):
+        response = test_client.get("api/search", params={"q": "bread", "cursor": encode_cursor(forged)})
+        assert response.status_code == 400
+
+
+def test_search_index_sync(create_test_db, test_client):
+    """Test, that search index follows updates and deletions of posts."""
+    post_id = test_client.get("api/search", params={"q": "sourdough", "scope": "posts"}).json()["items"][0]["id"]
+
+    response = test_client.put(f"api/posts/{post_id}", json={"title": "Rye baking", "content": "Rye flour"},
+                               headers={"Authorization": user.access_token})
+    assert response.status_code == 200
+    assert test_client.get("api/search", params={"q": "sourdough", "scope": "posts"}).json()["items"] == []
+    assert [item["id"] for item in
+            test_client.get("api/search", params={"q": "rye", "scope": "posts"}).json()["items"]] == [post_id]
+
+    response = test_client.delete(f"api/posts/{post_id}", headers={"Authorization": user.access_token})
+    assert response.status_code == 200
+    assert test_client.get("api/search", params={"q": "rye"}).json()["items"] == []
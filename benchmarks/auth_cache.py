@@ -0,0 +1,91 @@
+"""
+Benchmark for per-request cost of authentication with and without authenticated users cache.
+
+Calls `get_current_user` dependency with valid token the way every authenticated request does. "uncached" variant
+clears the cache before every call, so user is loaded from database each time, "cached" variant reuses snapshot.
+
+Usage:
+    python -m benchmarks.auth_cache --calls 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+# Token signing settings are read from environment on import
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.core.security import create_access_token, get_current_user, user_cache  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+def seed(db_path: str) -> None:
+    """Create tables with one user"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="-"))
+        db.commit()
+    engine.dispose()
+
+
+async def run_scenario(session_factory: async_sessionmaker, token: str, calls: int, cached: bool) -> dict:
+    """Authenticate given amount of times, one session per call like a request"""
+    user_cache.clear()
+    hits, misses = user_cache.hits, user_cache.misses
+    latencies = []
+    for _ in range(calls):
+        if not cached:
+            user_cache.clear()
+        started = time.perf_counter()
+        async with session_factory() as db:
+            await get_current_user(db=db, token=token)
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    return {
+        "calls": calls,
+        "mean_us": round(sum(latencies) / len(latencies) * 1e6, 1),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+        "cache_hits": user_cache.hits - hits,
+        "cache_misses": user_cache.misses - misses,
+    }
+
+
+async def main(calls: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        seed(db_path)
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+        token = create_access_token(data={"sub": "bench"})
+
+        try:
+            uncached = await run_scenario(session_factory, token, calls, cached=False)
+            cached = await run_scenario(session_factory, token, calls, cached=True)
+        finally:
+            await async_engine.dispose()
+
+    return {
+        "uncached": uncached,
+        "cached": cached,
+        "mean_saved_us": round(uncached["mean_us"] - cached["mean_us"], 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=5000, help="Amount of authentications per scenario")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args.calls)), indent=4))
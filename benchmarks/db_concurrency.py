@@ -0,0 +1,141 @@
+"""
+Benchmark for concurrent request throughput of the synchronous and asynchronous database layers.
+
+Both variants serve the same query from an `async def` handler: "sync" uses `Session` the way routers did before,
+"async" uses `AsyncSession` from `get_async_db`. Event loop stall is measured by a ticker task, that records
+how late it was woken up while requests were in flight.
+
+Usage:
+    python -m benchmarks.db_concurrency --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import Engine, create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.database import Base
+from app.models import Comment, Post, User
+
+
+def seed(db_path: str, comments_amount: int) -> None:
+    """Create tables and fill them with one user, one post and given amount of comments"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="-"))
+        db.add(Post(id=1, title="bench", content="bench", owner_id=1))
+        db.add_all([Comment(content=f"comment {i}", created_at=datetime.now(), owner_id=1, post_id=1)
+                    for i in range(comments_amount)])
+        db.commit()
+    engine.dispose()
+
+
+def build_app(sync_engine: Engine, async_engine: AsyncEngine) -> FastAPI:
+    """Build app with the same query served through sync and async sessions"""
+    async_session_local = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def get_sync_db():
+        db = Session(sync_engine)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with async_session_local() as db:
+            yield db
+
+    # Scan over the whole comments table, so each query takes a few milliseconds like a real analytics one
+    statement = select(func.count(Comment.id)).filter(Comment.post_id == 1, Comment.content.like("%7%"))
+
+    bench_app = FastAPI()
+
+    @bench_app.get("/sync")
+    async def sync_handler(db: Session = Depends(get_sync_db)) -> dict:
+        return {"count": db.execute(statement).one()[0]}
+
+    @bench_app.get("/async")
+    async def async_handler(db: AsyncSession = Depends(get_async_db)) -> dict:
+        return {"count": (await db.execute(statement)).one()[0]}
+
+    return bench_app
+
+
+async def run_scenario(bench_app: FastAPI, path: str, requests_amount: int, concurrency: int) -> dict:
+    """Send requests to given path with limited concurrency and measure throughput and event loop stall"""
+    stalls = []
+    running = True
+
+    async def ticker(interval: float = 0.005):
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            stalls.append(time.perf_counter() - started - interval)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=bench_app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_request():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        ticker_task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await asyncio.gather(*[one_request() for _ in range(requests_amount)])
+        elapsed = time.perf_counter() - started
+        running = False
+        await ticker_task
+
+    stalls.sort()
+    return {
+        "requests": requests_amount,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests_amount / elapsed, 1),
+        "max_event_loop_stall_ms": round(stalls[-1] * 1000, 2) if stalls else 0.0,
+        "p99_event_loop_stall_ms": round(stalls[int(len(stalls) * 0.99)] * 1000, 2) if stalls else 0.0,
+    }
+
+
+async def main(requests_amount: int, concurrency: int, comments_amount: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        seed(db_path, comments_amount)
+
+        # Pools are sized to concurrency: a blocking checkout from exhausted sync pool would deadlock the event loop
+        sync_engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False},
+                                    pool_size=concurrency)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}",
+                                           poolclass=AsyncAdaptedQueuePool, pool_size=concurrency)
+        bench_app = build_app(sync_engine, async_engine)
+
+        try:
+            return {
+                "sync_session": await run_scenario(bench_app, "/sync", requests_amount, concurrency),
+                "async_session": await run_scenario(bench_app, "/async", requests_amount, concurrency),
+            }
+        finally:
+            sync_engine.dispose()
+            await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Total amount of requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="Amount of requests in flight")
+    parser.add_argument("--comments", type=int, default=20000, help="Amount of seeded comments")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args.requests, args.concurrency, args.comments)), indent=4))
@@ -0,0 +1,75 @@
+"""
+Benchmark for latency of outbound OpenAI API calls with per-call and shared pooled HTTP clients.
+
+Moderation service calls local stub server: "per_call" variant opens new client and connection for every call,
+the way services did before, "shared" variant reuses kept-alive connections of the client from
+`create_http_client`. Connections to real API also pay for TLS handshake, so saving there is bigger.
+
+Usage:
+    python -m benchmarks.http_client --calls 500 --concurrency 10 --latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.core.http_client import create_http_client
+from app.services.llm_moderation import ModerationService
+from benchmarks.openai_stub import run_stub_server
+
+
+async def run_scenario(service: ModerationService, calls: int, concurrency: int) -> dict:
+    """Make moderation calls with limited concurrency and measure per-call latency"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_call(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await service.moderate_content(f"comment {i}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one_call(i) for i in range(calls)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "calls": calls,
+        "concurrency": concurrency,
+        "calls_per_second": round(calls / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+async def main(calls: int, concurrency: int, latency_ms: float) -> dict:
+    async with run_stub_server(latency_ms=latency_ms) as base_url:
+        # No cache and no batching, so every call goes to the stub
+        service = ModerationService(api_key="bench", api_base_url=base_url)
+
+        per_call = await run_scenario(service, calls, concurrency)
+
+        service.http_client = create_http_client()
+        try:
+            shared = await run_scenario(service, calls, concurrency)
+        finally:
+            await service.http_client.aclose()
+
+    return {
+        "stub_latency_ms": latency_ms,
+        "per_call_client": per_call,
+        "shared_client": shared,
+        "mean_latency_saved_ms": round(per_call["mean_ms"] - shared["mean_ms"], 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500, help="Total amount of calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Amount of calls in flight")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Response latency of stub server")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args.calls, args.concurrency, args.latency_ms)), indent=4))
@@ -0,0 +1,239 @@
+"""
+In-process load test of the whole application against local stub OpenAI API.
+
+Seeds temporary database with users, posts and comments, then runs concurrent scenarios through `httpx.AsyncClient`
+on the ASGI app, with application lifespan running:
+
+ - read_feed: posts pages, single posts and comments pages, the way feed is browsed
+ - comment_storm: comments created by random users, moderated by stub server
+ - analytics_range: comments daily breakdown for a month
+ - login_burst: logins with password, paying for bcrypt
+
+Moderation and auto-reply services call the stub server, that answers after given latency and flags given share of
+contents. Every scenario reports requests per second, latency percentiles, response status codes and amount of
+database queries per request, so runs with different settings or code can be compared. Startup is reported as time
+of importing the app and of lifespan startup with its warm-up steps.
+
+Application settings are read from environment on import, so benchmark sets DATABASE_URL, OPENAI_BASE_URL and
+BCRYPT_ROUNDS before importing the app. Other settings, e.g. MODERATION_CACHE_BACKEND, can be set in environment too.
+
+Usage:
+    python -m benchmarks.load_test --users 100 --posts 1000 --comments 50000 --requests 2000 --concurrency 50
+    python -m benchmarks.load_test --scenarios read_feed comment_storm --latency-ms 50 --flag-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+import httpx
+
+from benchmarks.openai_stub import run_stub_server
+
+SCENARIOS = ["read_feed", "comment_storm", "analytics_range", "login_burst"]
+PASSWORD = "benchmark-password"
+SEED_DAYS = 30
+
+
+def seed(users_amount: int, posts_amount: int, comments_amount: int) -> None:
+    """Create tables and fill them with users, posts and comments, spread over last SEED_DAYS days"""
+    from sqlalchemy import insert
+    from app.core.security import get_password_hash
+    from app.database import Base, engine
+    from app.models import Comment, Post, User
+    from app.services.comment_daily_stats import rebuild_comment_daily_stats
+
+    rng = random.Random(0)
+    now = datetime.now()
+    # All users share the password, so it is hashed once
+    hashed_password = get_password_hash(PASSWORD)
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": hashed_password,
+             "auto_respond_to_comments": i % 10 == 0, "auto_respond_time": 1}
+            for i in range(1, users_amount + 1)
+        ])
+        connection.execute(insert(Post), [
+            {"id": i, "title": f"Post {i}", "content": f"Content of post {i}", "owner_id": rng.randint(1, users_amount)}
+            for i in range(1, posts_amount + 1)
+        ])
+        for offset in range(0, comments_amount, 10000):
+            connection.execute(insert(Comment), [
+                {"content": f"Comment {i}", "created_at": now - timedelta(seconds=rng.randint(0, SEED_DAYS * 86400)),
+                 "owner_id": rng.randint(1, users_amount), "post_id": rng.randint(1, posts_amount)}
+                for i in range(offset, min(offset + 10000, comments_amount))
+            ])
+        rebuild_comment_daily_stats(connection)
+
+
+def build_scenarios(users_amount: int, posts_amount: int) -> dict[str, Callable[[httpx.AsyncClient, int], Awaitable]]:
+    """Build functions, sending one request of every scenario"""
+    from app.core.security import create_access_token
+
+    tokens = {}
+
+    def auth_headers(user_id: int) -> dict:
+        if user_id not in tokens:
+            tokens[user_id] = create_access_token(data={"sub": f"user{user_id}"})
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    def random_post_id() -> int:
+        return random.randint(1, posts_amount)
+
+    async def read_feed(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        kind = i % 3
+        if kind == 0:
+            return await client.get("/api/posts", params={"limit": 20})
+        if kind == 1:
+            return await client.get(f"/api/posts/{random_post_id()}")
+        return await client.get(f"/api/posts/{random_post_id()}/comments", params={"limit": 20})
+
+    async def comment_storm(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.post(f"/api/posts/{random_post_id()}/comments",
+                                 json={"content": f"Storm comment {i}"},
+                                 headers=auth_headers(random.randint(1, users_amount)))
+
+    async def analytics_range(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        today = datetime.now().date()
+        return await client.get("/api/comments-daily-breakdown",
+                                params={"date_from": (today - timedelta(days=SEED_DAYS)).isoformat(),
+                                        "date_to": today.isoformat(),
+                                        "items_per_day": 10})
+
+    async def login_burst(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.post("/api/login",
+                                 data={"username": f"user{random.randint(1, users_amount)}", "password": PASSWORD})
+
+    return {
+        "read_feed": read_feed,
+        "comment_storm": comment_storm,
+        "analytics_range": analytics_range,
+        "login_burst": login_burst,
+    }
+
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    """Value of sorted list at given share, in milliseconds"""
+    return round(sorted_values[min(int(len(sorted_values) * share), len(sorted_values) - 1)] * 1000, 2)
+
+
+async def run_scenario(client: httpx.AsyncClient, send: Callable[[httpx.AsyncClient, int], Awaitable],
+                       requests_amount: int, concurrency: int, queries: Counter) -> dict:
+    """Send requests of scenario with limited concurrency and measure throughput, latency and database queries"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+
+    async def one_request(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send(client, i)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    queries_before = queries["total"]
+    started = time.perf_counter()
+    await asyncio.gather(*[one_request(i) for i in range(requests_amount)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests_amount,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests_amount / elapsed, 1),
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": percentile(latencies, 1),
+        "status_codes": {str(code): amount for code, amount in sorted(statuses.items())},
+        "db_queries": queries["total"] - queries_before,
+        "db_queries_per_request": round((queries["total"] - queries_before) / requests_amount, 2),
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        async with run_stub_server(latency_ms=args.latency_ms, flag_rate=args.flag_rate) as stub_url:
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+            os.environ["OPENAI_BASE_URL"] = stub_url
+            os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+            os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+            os.environ.setdefault("JWT_ALGORITHM", "HS256")
+            os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+            # Import of the app, i.e. startup work, that every worker and test run pays before lifespan
+            started = time.perf_counter()
+            from app.main import app
+            import_seconds = time.perf_counter() - started
+
+            from sqlalchemy import event
+            from app.database import async_engine
+
+            # Log of every request made by the client would slow the benchmark down
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+
+            started = time.perf_counter()
+            seed(args.users, args.posts, args.comments)
+            seed_seconds = time.perf_counter() - started
+
+            # Statements executed by request handlers and background tasks of the app
+            queries = Counter()
+
+            @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+            def count_query(*_):
+                queries["total"] += 1
+
+            scenarios = build_scenarios(args.users, args.posts)
+            results = {}
+            transport = httpx.ASGITransport(app=app)
+            started = time.perf_counter()
+            async with app.router.lifespan_context(app):
+                lifespan_seconds = time.perf_counter() - started
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                    for name in args.scenarios:
+                        results[name] = await run_scenario(client, scenarios[name], args.requests,
+                                                           args.concurrency, queries)
+
+    return {
+        "config": {
+            "users": args.users,
+            "posts": args.posts,
+            "comments": args.comments,
+            "stub_latency_ms": args.latency_ms,
+            "stub_flag_rate": args.flag_rate,
+            "bcrypt_rounds": args.bcrypt_rounds,
+        },
+        "startup": {
+            "import_seconds": round(import_seconds, 3),
+            "lifespan_seconds": round(lifespan_seconds, 3),
+            "lifespan_steps": {step: round(seconds, 3) for step, seconds in app.state.startup_timings.items()},
+        },
+        "seed_seconds": round(seed_seconds, 2),
+        "scenarios": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="Amount of seeded users")
+    parser.add_argument("--posts", type=int, default=1000, help="Amount of seeded posts")
+    parser.add_argument("--comments", type=int, default=50000, help="Amount of seeded comments")
+    parser.add_argument("--requests", type=int, default=2000, help="Amount of requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="Amount of requests in flight")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="Scenarios to run")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latency of stub OpenAI API responses")
+    parser.add_argument("--flag-rate", type=float, default=0.05, help="Share of contents flagged by stub moderation")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="Cost of seeded password hashes and logins")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args)), indent=4))
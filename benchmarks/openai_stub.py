@@ -0,0 +1,66 @@
+"""
+Local stand-in for OpenAI moderation and chat completion endpoints, used by benchmarks.
+
+Responds after configurable latency. Moderation flags contents containing "flag" word,
+and also random share of other contents given by flag rate.
+"""
+import asyncio
+import random
+import socket
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+def build_stub_app(latency_ms: float = 0, flag_rate: float = 0) -> FastAPI:
+    """
+    Build stub OpenAI API app
+    :param latency_ms: Delay before every response, in milliseconds
+    :param flag_rate: Share of moderated contents, that are flagged at random
+    """
+    stub_app = FastAPI()
+
+    def moderation_result(content: str) -> dict:
+        flagged = "flag" in content.lower() or random.random() < flag_rate
+        return {"flagged": flagged, "categories": {"harassment": flagged}, "category_scores": {}}
+
+    @stub_app.post("/v1/moderations")
+    async def moderations(request: Request) -> dict:
+        await asyncio.sleep(latency_ms / 1000)
+        contents = (await request.json())["input"]
+        if isinstance(contents, str):
+            contents = [contents]
+        return {"id": "modr-stub", "model": "stub", "results": [moderation_result(content) for content in contents]}
+
+    @stub_app.post("/v1/chat/completions")
+    async def chat_completions() -> dict:
+        await asyncio.sleep(latency_ms / 1000)
+        return {"choices": [{"message": {"role": "assistant", "content": "Thanks for your comment!"}}]}
+
+    return stub_app
+
+
+@asynccontextmanager
+async def run_stub_server(latency_ms: float = 0, flag_rate: float = 0) -> AsyncIterator[str]:
+    """
+    Serve stub OpenAI API on free local port in the current event loop
+    :return: Base url of the server, e.g. "http://127.0.0.1:8123/v1"
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(build_stub_app(latency_ms, flag_rate), log_level="warning",
+                                           access_log=False, lifespan="off"))
+    server_task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        await server_task
+        sock.close()
@@ -0,0 +1,127 @@
+"""
+Benchmark for full-text search of comments with FTS5 index against `LIKE` scan.
+
+Seeds database with given amount of comments of random words from a fixed vocabulary, so some words are rare and
+others are in most comments. Comments are inserted after tables and triggers are created, so seeding time includes
+index maintenance by triggers. Then `GET /api/search` is requested for rare, medium and common words, and the same
+words are counted with `LIKE` scan over comments table as a baseline.
+
+Usage:
+    python -m benchmarks.search --comments 1000000 --requests 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.database import Base, get_async_db
+from app.models import Comment, Post, User
+from app.routers import search_router
+
+# Word frequencies follow Zipf's law, so the first words are common and the last ones are rare
+VOCABULARY = [f"word{i}" for i in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+QUERIES = {"common": "word0", "medium": "word50", "rare": "word4000", "two words": "word1 word20"}
+
+
+def seed(db_path: str, comments_amount: int, batch_size: int = 10000) -> float:
+    """
+    Create tables and fill them with one user, one post and given amount of comments
+    :return: Seeding time, in seconds
+    """
+    rng = random.Random(0)
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    started = time.perf_counter()
+    with Session(engine) as db:
+        db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="-"))
+        db.add(Post(id=1, title="bench", content="bench", owner_id=1))
+        created_at = datetime.now()
+        for offset in range(0, comments_amount, batch_size):
+            db.execute(insert(Comment), [
+                {"content": " ".join(rng.choices(VOCABULARY, WEIGHTS, k=12)), "created_at": created_at,
+                 "owner_id": 1, "post_id": 1}
+                for _ in range(min(batch_size, comments_amount - offset))
+            ])
+        db.commit()
+    engine.dispose()
+    return time.perf_counter() - started
+
+
+async def measure(call, requests_amount: int) -> dict:
+    """Await given call sequentially and report latency percentiles, in milliseconds"""
+    latencies = []
+    for _ in range(requests_amount):
+        started = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+    }
+
+
+async def main(comments_amount: int, requests_amount: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        seed_seconds = seed(db_path, comments_amount)
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        async def get_bench_db():
+            async with session_factory() as db:
+                yield db
+
+        bench_app = FastAPI()
+        bench_app.include_router(search_router, prefix="/api")
+        bench_app.dependency_overrides[get_async_db] = get_bench_db
+
+        results = {}
+        try:
+            transport = httpx.ASGITransport(app=bench_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for name, query in QUERIES.items():
+                    async def search():
+                        response = await client.get("/api/search", params={"q": query, "scope": "comments"})
+                        response.raise_for_status()
+
+                    like_filter = [Comment.content.like(f"%{word}%") for word in query.split()]
+
+                    async def scan():
+                        async with session_factory() as db:
+                            return await db.scalar(select(func.count(Comment.id)).filter(*like_filter))
+
+                    # LIKE also matches longer words with the same prefix, so amount of matches is an upper bound
+                    matches = await scan()
+
+                    results[name] = {
+                        "query": query,
+                        "like_matches": matches,
+                        "fts_first_page": await measure(search, requests_amount),
+                        "like_scan": await measure(scan, max(1, requests_amount // 10)),
+                    }
+        finally:
+            await async_engine.dispose()
+
+    return {"comments": comments_amount, "seed_seconds": round(seed_seconds, 1), "queries": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=1_000_000, help="Amount of comments to seed")
+    parser.add_argument("--requests", type=int, default=50, help="Amount of search requests per query")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args.comments, args.requests)), indent=4))